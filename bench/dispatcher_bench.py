@@ -0,0 +1,252 @@
+"""
+Нагрузочный прогон хендлеров: настоящий Dispatcher со всеми роутерами из
+bot.py, сессия Bot API подменена заглушкой с заданной задержкой, обновления
+подаются через Dispatcher.feed_update.
+
+База SQLite заполняется заранее (--warns строк в warns по --chats чатам);
+с --db можно переиспользовать уже заполненный файл.
+
+    python -m bench.dispatcher_bench --warns 100000 --updates 2000 --latency 0.02
+    python -m bench.dispatcher_bench --scenarios warn,warns_page --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ("chatter", "warn", "mute", "warns_page", "nick", "ping_chat", "mix")
+# Доли сценариев в "mix": в основном обычные сообщения
+MIX_WEIGHTS = {"chatter": 80, "warn": 5, "mute": 3, "warns_page": 4, "nick": 5, "ping_chat": 3}
+
+ISSUER_ID = 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="файл SQLite; если не существует — будет создан и заполнен")
+    parser.add_argument("--warns", type=int, default=10000, help="строк в warns при заполнении")
+    parser.add_argument("--chats", type=int, default=50, help="чатов в базе")
+    parser.add_argument("--users", type=int, default=2000, help="пользователей на чат")
+    parser.add_argument("--updates", type=int, default=1000, help="обновлений на сценарий")
+    parser.add_argument("--concurrency", type=int, default=20, help="обновлений в обработке одновременно")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="через запятую: " + ", ".join(SCENARIOS))
+    parser.add_argument("--rate-limit", action="store_true", help="оставить rate_limiter в сессии бота")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+_tmp = None
+if args.db is None:
+    _tmp = tempfile.TemporaryDirectory()
+    args.db = os.path.join(_tmp.name, "bench.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+os.environ["METRICS_PORT"] = "0"
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import (  # noqa: E402
+    Chat, ChatFullInfo, ChatMemberMember, ChatMemberOwner, Message, Update, User,
+)
+from sqlalchemy import func, insert, select  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from db import AsyncSessionLocal, engine, init_db  # noqa: E402
+from models import Chat as ChatRow, RoleAssignment, Warn  # noqa: E402
+from services import metrics_service as metrics  # noqa: E402
+
+
+class BenchSession(BaseSession):
+    """
+    Сессия Bot API с готовыми ответами: каждый запрос "идёт" latency секунд.
+    """
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        name = type(method).__name__
+        chat_id = getattr(method, "chat_id", -1)
+        chat_id = chat_id if isinstance(chat_id, int) else -1
+        user_id = getattr(method, "user_id", ISSUER_ID)
+        now = datetime.now()
+        chat = Chat(id=chat_id, type="supergroup", title="bench")
+        if name in ("SendMessage", "EditMessageText", "SendDocument"):
+            return Message(message_id=1, date=now, chat=chat, text=getattr(method, "text", None))
+        if name == "GetChatMember":
+            return ChatMemberMember(user=User(id=user_id, is_bot=False, first_name=f"user{user_id}"))
+        if name == "GetChatAdministrators":
+            return [ChatMemberOwner(user=User(id=ISSUER_ID, is_bot=False, first_name="owner"), is_anonymous=False)]
+        if name == "GetChat":
+            return ChatFullInfo(id=chat_id, type="supergroup", title="bench", accent_color_id=0, max_reaction_count=11)
+        if name in ("GetChatMemberCount", "GetChatMembersCount"):
+            return 1000
+        if name == "GetMe":
+            return User(id=42, is_bot=True, first_name="bench")
+        return True
+
+
+async def seed(warns: int, chats: int, users: int):
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        if await session.scalar(select(func.count()).select_from(Warn)):
+            print(f"База {args.db} уже заполнена, пропускаю заполнение")
+            return
+        chat_ids = [-1000000000000 - i for i in range(chats)]
+        await session.execute(insert(ChatRow), [{"id": c} for c in chat_ids])
+        await session.execute(insert(RoleAssignment), [
+            {"chat_id": c, "user_id": ISSUER_ID, "role_id": 5, "assigned_at": datetime.utcnow()} for c in chat_ids])
+        rnd = random.Random(args.seed)
+        base = datetime.utcnow() - timedelta(days=90)
+        t0 = time.perf_counter()
+        chunk = 20000
+        for start in range(0, warns, chunk):
+            rows = []
+            for i in range(start, min(warns, start + chunk)):
+                rows.append({
+                    "chat_id": rnd.choice(chat_ids),
+                    "user_id": 1000 + rnd.randrange(users),
+                    "issued_by": ISSUER_ID,
+                    "reason": "seed",
+                    "active": rnd.random() < 0.7,
+                    "created_at": base + timedelta(seconds=i * 7),
+                })
+            await session.execute(insert(Warn), rows)
+        await session.commit()
+    print(f"Заполнено: {warns} warns в {chats} чатах за {time.perf_counter() - t0:.1f}s")
+
+
+class UpdateFactory:
+    def __init__(self, chats: int, users: int, rnd: random.Random):
+        self.chat_ids = [-1000000000000 - i for i in range(chats)]
+        self.users = users
+        self.rnd = rnd
+        self.ids = itertools.count(1)
+        self.page_callbacks = {}
+
+    def _chat(self, chat_id):
+        return {"id": chat_id, "type": "supergroup", "title": "bench"}
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def message(self, text, user_id=None, reply_to=None, chat_id=None):
+        chat_id = chat_id or self.rnd.choice(self.chat_ids)
+        user_id = user_id or 1000 + self.rnd.randrange(self.users)
+        data = {"message_id": next(self.ids), "date": int(time.time()), "chat": self._chat(chat_id),
+                "from": self._user(user_id), "text": text}
+        if reply_to:
+            data["reply_to_message"] = {"message_id": next(self.ids), "date": int(time.time()),
+                                        "chat": self._chat(chat_id), "from": self._user(reply_to), "text": "..."}
+        return Update.model_validate({"update_id": next(self.ids), "message": data})
+
+    def callback(self, data, chat_id):
+        message = {"message_id": next(self.ids), "date": int(time.time()), "chat": self._chat(chat_id), "text": "list"}
+        return Update.model_validate({"update_id": next(self.ids), "callback_query": {
+            "id": str(next(self.ids)), "from": self._user(ISSUER_ID), "chat_instance": "bench",
+            "message": message, "data": data}})
+
+    async def prepare(self):
+        from handlers.warns_handler import fetch_warns_page
+
+        for chat_id in self.chat_ids:
+            page = await fetch_warns_page(chat_id, None, 1)
+            if page is not None and page.total_pages > 1:
+                self.page_callbacks[chat_id] = f"warns:2:n:{page.next_cursor}"
+
+    def make(self, scenario: str) -> Update:
+        if scenario == "mix":
+            scenario = self.rnd.choices(list(MIX_WEIGHTS), weights=list(MIX_WEIGHTS.values()))[0]
+        target = 1000 + self.rnd.randrange(self.users)
+        if scenario == "chatter":
+            return self.message(self.rnd.choice(("привет", "как дела?", "ок", "лол", "кто в игру")))
+        if scenario == "warn":
+            return self.message("+пред флуд", user_id=ISSUER_ID, reply_to=target)
+        if scenario == "mute":
+            return self.message("мут 10m флуд", user_id=ISSUER_ID, reply_to=target)
+        if scenario == "warns_page":
+            if not self.page_callbacks:
+                return self.message("?варн", user_id=ISSUER_ID)
+            chat_id = self.rnd.choice(list(self.page_callbacks))
+            return self.callback(self.page_callbacks[chat_id], chat_id)
+        if scenario == "nick":
+            if self.rnd.random() < 0.5:
+                return self.message(f"ник Игрок{target}", user_id=target)
+            return self.message("ник", reply_to=target)
+        if scenario == "ping_chat":
+            return self.message("ping chat")
+        raise ValueError(scenario)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_scenario(dp, bot, factory: UpdateFactory, scenario: str, updates: int, concurrency: int):
+    updates_list = [factory.make(scenario) for _ in range(updates)]
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(update):
+        async with sem:
+            t0 = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - t0)
+
+    db_before = metrics.db_queries_total.total()
+    api_before = bot.session.calls
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(u) for u in updates_list))
+    elapsed = time.perf_counter() - t0
+    db_per_update = (metrics.db_queries_total.total() - db_before) / updates
+    api_per_update = (bot.session.calls - api_before) / updates
+    print(f"{scenario:11} {updates / elapsed:9.1f} upd/s  p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  DB {db_per_update:5.2f} q/upd  "
+          f"API {api_per_update:5.2f} req/upd")
+
+
+async def main():
+    import logging
+
+    logging.disable(logging.INFO)
+    await seed(args.warns, args.chats, args.users)
+
+    bot, dp = bot_module.bot, bot_module.dp
+    session = BenchSession(args.latency)
+    if args.rate_limit:
+        session.middleware(bot_module.rate_limiter)
+    bot.session = session
+
+    factory = UpdateFactory(args.chats, args.users, random.Random(args.seed))
+    await factory.prepare()
+
+    print(f"updates={args.updates} concurrency={args.concurrency} latency={args.latency}s warns={args.warns}")
+    for scenario in args.scenarios.split(","):
+        await run_scenario(dp, bot, factory, scenario.strip(), args.updates, args.concurrency)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,324 @@
+"""
+Заглушка Bot API на aiohttp для нагрузочных прогонов без Telegram.
+
+Отвечает на методы, которыми пользуются хендлеры (getUpdates, sendMessage,
+getChatMember, getChatAdministrators, restrictChatMember, banChatMember, ...),
+соблюдает лимиты на отправку (30 сообщений/с всего, 20/мин в группу, 1/с в
+личку) и на превышение отвечает 429 с retry_after. Встроенный генератор
+создаёт трафик от --chats чатов и --users пользователей и отдаёт его через
+getUpdates или, с --webhook, отправляет POST-ом на webhook бота.
+
+Раз в --report секунд печатает: сгенерировано обновлений, вызовов API,
+ответов 429 и задержку от появления сообщения до ответа бота на него.
+
+    python -m bench.fake_api --port 8081 --rate 200
+    API_BASE_URL=http://127.0.0.1:8081 BOT_TOKEN=123456:fake python bot.py
+
+    python -m bench.fake_api --webhook http://127.0.0.1:8080/webhook --secret s3
+    RUN_MODE=webhook WEBHOOK_SECRET=s3 API_BASE_URL=http://127.0.0.1:8081 python bot.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict, deque
+
+from aiohttp import ClientSession, web
+
+OWNER_ID = 1
+SEND_METHODS = {
+    "sendmessage", "editmessagetext", "senddocument", "sendphoto", "copymessage", "forwardmessage",
+}
+TEXTS = (
+    (80, lambda r, u: r.choice(("привет", "как дела?", "ок", "лол", "кто в игру"))),
+    (5, lambda r, u: "+пред флуд"),
+    (3, lambda r, u: "мут 10m флуд"),
+    (3, lambda r, u: "?пред"),
+    (5, lambda r, u: f"ник Игрок{u}"),
+    (2, lambda r, u: "ping chat"),
+    (2, lambda r, u: "админы"),
+)
+
+
+class Window:
+    """
+    Счётчик событий в скользящем окне для лимитов.
+    """
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.events = deque()
+
+    def hit(self, now: float) -> float:
+        """
+        Возвращает 0, если событие разрешено, иначе через сколько секунд повторить.
+        """
+        while self.events and self.events[0] <= now - self.period:
+            self.events.popleft()
+        if len(self.events) >= self.limit:
+            return self.events[0] + self.period - now
+        self.events.append(now)
+        return 0.0
+
+
+class Stats:
+    def __init__(self):
+        self.generated = 0
+        self.calls = 0
+        self.flood = 0
+        self.latencies = []
+
+    def reset(self):
+        self.__init__()
+
+
+class FakeBotAPI:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.ids = itertools.count(1)
+        self.updates = deque()
+        self.new_updates = asyncio.Event()
+        self.global_window = Window(args.global_limit, 1.0)
+        self.chat_windows = {}
+        # (chat_id, message_id) -> момент генерации, для задержки ответа
+        self.pending_replies = {}
+        self.stats = Stats()
+        self.chat_ids = [-1000000000000 - i for i in range(args.chats)]
+        self.member_status = defaultdict(lambda: "member")
+        self.webhook_url = args.webhook
+
+    # --- трафик ---
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+    def _chat(self, chat_id):
+        if chat_id > 0:
+            return {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"}
+        return {"id": chat_id, "type": "supergroup", "title": f"chat{chat_id}"}
+
+    def make_update(self):
+        chat_id = self.rnd.choice(self.chat_ids)
+        target = 1000 + self.rnd.randrange(self.args.users)
+        text = self.rnd.choices([f for _, f in TEXTS], weights=[w for w, _ in TEXTS])[0](self.rnd, target)
+        moderation = text.startswith(("+пред", "мут"))
+        user_id = OWNER_ID if moderation else target
+        message_id = next(self.ids)
+        message = {"message_id": message_id, "date": int(time.time()), "chat": self._chat(chat_id),
+                   "from": self._user(user_id), "text": text}
+        if moderation:
+            message["reply_to_message"] = {"message_id": next(self.ids), "date": int(time.time()),
+                                           "chat": self._chat(chat_id), "from": self._user(target), "text": "..."}
+        self.pending_replies[(chat_id, message_id)] = time.perf_counter()
+        if len(self.pending_replies) > 100000:
+            self.pending_replies.pop(next(iter(self.pending_replies)))
+        self.stats.generated += 1
+        return {"update_id": next(self.ids), "message": message}
+
+    async def generate(self):
+        interval = 1.0 / self.args.rate
+        http = ClientSession() if self.webhook_url else None
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.args.secret} if self.args.secret else {}
+        next_at = time.perf_counter()
+        try:
+            while True:
+                update = self.make_update()
+                if http is not None:
+                    asyncio.create_task(self._post(http, update, headers))
+                else:
+                    self.updates.append(update)
+                    self.new_updates.set()
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            if http is not None:
+                await http.close()
+
+    async def _post(self, http, update, headers):
+        try:
+            async with http.post(self.webhook_url, json=update, headers=headers) as resp:
+                await resp.read()
+        except Exception as e:
+            print("webhook error:", e)
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.args.report)
+            s = self.stats
+            lat = sorted(s.latencies)
+            p = (lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1000) if lat else (lambda q: 0.0)
+            period = self.args.report
+            print(f"updates {s.generated / period:7.1f}/s  api {s.calls / period:7.1f}/s  429: {s.flood:4}  "
+                  f"replies {len(lat):5}  p50 {p(0.5):7.1f} ms  p99 {p(0.99):7.1f} ms  "
+                  f"queued {len(self.updates)}", flush=True)
+            s.reset()
+
+    # --- Bot API ---
+
+    async def params(self, request):
+        data = {}
+        if request.content_type == "application/json":
+            data = await request.json()
+        elif request.can_read_body:
+            for key, value in (await request.post()).items():
+                if isinstance(value, str):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        pass
+                data[key] = value
+        data.update(request.query)
+        return data
+
+    def ok(self, result):
+        return web.json_response({"ok": True, "result": result})
+
+    def flood(self, retry_after: float):
+        self.stats.flood += 1
+        retry_after = max(1, int(retry_after + 0.999))
+        return web.json_response({"ok": False, "error_code": 429,
+                                  "description": f"Too Many Requests: retry after {retry_after}",
+                                  "parameters": {"retry_after": retry_after}}, status=429)
+
+    def check_limits(self, chat_id) -> float:
+        now = time.monotonic()
+        window = self.chat_windows.get(chat_id)
+        if window is None:
+            private = isinstance(chat_id, int) and chat_id > 0
+            window = Window(1, 1.0) if private else Window(self.args.group_limit, 60.0)
+            self.chat_windows[chat_id] = window
+        wait = window.hit(now)
+        if wait:
+            return wait
+        wait = self.global_window.hit(now)
+        if wait:
+            window.events.pop()
+        return wait
+
+    async def handle(self, request):
+        method = request.match_info["method"].lower()
+        self.stats.calls += 1
+        p = await self.params(request)
+        if self.args.api_latency:
+            await asyncio.sleep(self.args.api_latency)
+        chat_id = p.get("chat_id")
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+
+        if method in SEND_METHODS and chat_id is not None:
+            wait = self.check_limits(chat_id)
+            if wait:
+                return self.flood(wait)
+
+        if method == "getupdates":
+            return await self.get_updates(p)
+        if method == "getme":
+            return self.ok({"id": 42, "is_bot": True, "first_name": "Woxl", "username": "fake_woxl_bot"})
+        if method in ("sendmessage", "editmessagetext", "senddocument"):
+            reply_to = p.get("reply_to_message_id") or (p.get("reply_parameters") or {}).get("message_id")
+            if reply_to is not None:
+                started = self.pending_replies.pop((chat_id, int(reply_to)), None)
+                if started is not None:
+                    self.stats.latencies.append(time.perf_counter() - started)
+            message = {"message_id": int(p.get("message_id") or next(self.ids)), "date": int(time.time()),
+                       "chat": self._chat(chat_id)}
+            if "text" in p:
+                message["text"] = p["text"]
+            return self.ok(message)
+        if method == "getchatmember":
+            user_id = int(p.get("user_id"))
+            status = "creator" if user_id == OWNER_ID else self.member_status[(chat_id, user_id)]
+            member = {"status": status, "user": self._user(user_id)}
+            if status == "creator":
+                member["is_anonymous"] = False
+            if status == "kicked":
+                member["until_date"] = 0
+            if status == "restricted":
+                member.update({k: True for k in (
+                    "is_member", "can_send_messages", "can_send_audios", "can_send_documents", "can_send_photos",
+                    "can_send_videos", "can_send_video_notes", "can_send_voice_notes", "can_send_polls",
+                    "can_send_other_messages", "can_add_web_page_previews", "can_change_info",
+                    "can_invite_users", "can_pin_messages", "can_manage_topics")})
+                member["until_date"] = 0
+            return self.ok(member)
+        if method == "getchatadministrators":
+            return self.ok([{"status": "creator", "user": self._user(OWNER_ID), "is_anonymous": False}])
+        if method == "getchat":
+            return self.ok({**self._chat(chat_id), "accent_color_id": 0, "max_reaction_count": 11})
+        if method in ("getchatmembercount", "getchatmemberscount"):
+            return self.ok(self.args.users)
+        if method == "restrictchatmember":
+            self.member_status[(chat_id, int(p["user_id"]))] = "restricted"
+            return self.ok(True)
+        if method == "banchatmember":
+            self.member_status[(chat_id, int(p["user_id"]))] = "kicked"
+            return self.ok(True)
+        if method == "unbanchatmember":
+            self.member_status[(chat_id, int(p["user_id"]))] = "left"
+            return self.ok(True)
+        if method == "getwebhookinfo":
+            return self.ok({"url": "", "has_custom_certificate": False, "pending_update_count": len(self.updates)})
+        # setMyCommands, deleteWebhook, setWebhook, answerCallbackQuery, deleteMessage, ...
+        return self.ok(True)
+
+    async def get_updates(self, p):
+        offset = int(p.get("offset") or 0)
+        limit = int(p.get("limit") or 100)
+        timeout = float(p.get("timeout") or 0)
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.popleft()
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.ok(list(itertools.islice(self.updates, 0, limit)))
+
+    def make_app(self):
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chats", type=int, default=200, help="чатов в генераторе")
+    parser.add_argument("--users", type=int, default=5000, help="пользователей в генераторе")
+    parser.add_argument("--rate", type=float, default=100, help="обновлений в секунду (0 — без трафика)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа на каждый запрос, с")
+    parser.add_argument("--global-limit", type=int, default=30, help="сообщений в секунду на бота")
+    parser.add_argument("--group-limit", type=int, default=20, help="сообщений в минуту в группу")
+    parser.add_argument("--webhook", help="URL webhook бота: слать обновления туда вместо getUpdates")
+    parser.add_argument("--secret", default="", help="X-Telegram-Bot-Api-Secret-Token для webhook")
+    parser.add_argument("--report", type=float, default=5.0, help="период отчёта, с")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args)
+    runner = web.AppRunner(api.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake Bot API on http://{args.host}:{args.port}")
+    tasks = [asyncio.create_task(api.report())]
+    if args.rate > 0:
+        tasks.append(asyncio.create_task(api.generate()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
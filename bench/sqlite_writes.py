@@ -0,0 +1,67 @@
+"""
+Пропускная способность записи в SQLite: движок SQLAlchemy с настройками
+по умолчанию против make_engine с профилем из config (WAL, synchronous=NORMAL,
+busy_timeout, ..., пул соединений DB_POOL_*).
+
+Нагрузка повторяет хендлеры: много конкурентных задач, каждая открывает
+сессию, добавляет Warn и делает commit.
+
+    python -m bench.sqlite_writes --writers 20 --writes 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from db import Base, make_engine, sqlite_pragmas  # noqa: E402
+from models import Warn  # noqa: E402
+
+
+async def run_profile(name: str, new_engine, writers: int, writes: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = new_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        errors = 0
+
+        async def writer(n: int):
+            nonlocal errors
+            for i in range(writes):
+                try:
+                    async with Session() as session:
+                        session.add(Warn(chat_id=-100 - n % 10, user_id=i, issued_by=n, reason="bench"))
+                        await session.commit()
+                except OperationalError:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(writer(n) for n in range(writers)))
+        elapsed = time.perf_counter() - t0
+        await engine.dispose()
+
+    total = writers * writes
+    print(f"{name:10} {total} commits in {elapsed:6.2f}s  {total / elapsed:8.1f} commits/s  errors: {errors}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=20, help="конкурентных задач")
+    parser.add_argument("--writes", type=int, default=200, help="коммитов на задачу")
+    args = parser.parse_args()
+
+    await run_profile("default", create_async_engine, args.writers, args.writes)
+    await run_profile("profile", lambda url: make_engine(url, sqlite_pragmas()), args.writers, args.writes)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
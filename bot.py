@@ -1,10 +1,12 @@
 import logging
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import BotCommandScopeDefault, BotCommand
 from aiogram import types
 
 from config import cfg
-from db import init_db
+from db import init_db, engine
 from handlers.start_handler import router as start_router
 from handlers.roles_handler import router as roles_router
 from handlers.nicks_handler import router as nicks_router
@@ -12,20 +14,52 @@ from handlers.warns_handler import router as warns_router
 from handlers.raven_handler import router as raven_router
 from handlers.moderation_handler import router as moderation_router
 from handlers.ping_handler import router as ping_router
-from db import AsyncSessionLocal
-from models import Chat, RoleAssignment
-from sqlalchemy import select
+from handlers.members_handler import router as members_router
 from datetime import datetime
 from handlers.new_year_handler import router as new_year_router
+from services.expiry_service import expiry
+from services.rate_limiter import rate_limiter
+from services.broadcast_service import broadcasts
+from services.chats_service import known_chats
+from services.admin_sync_service import admin_sync
+from services.chat_info_service import chat_info
+from services.members_service import members
+from services.usernames_service import usernames
+from services.latency_service import latency
+from services.activity_service import activity
+from middlewares.activity_middleware import ActivityMiddleware
+from middlewares.usernames_middleware import UsernamesMiddleware
+from middlewares.commands_middleware import CommandsMiddleware
+from middlewares.profiler_middleware import ProfilerMiddleware
+from middlewares.metrics_middleware import UpdateMetricsMiddleware, HandlerMetricsMiddleware, ApiMetricsMiddleware
+from services.metrics_service import ErrorLogHandler, instrument_engine, start_metrics_server
+from webhook import run_webhook
 
 logging.basicConfig(level=logging.INFO)
+logging.getLogger().addHandler(ErrorLogHandler())
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=cfg.BOT_TOKEN)
+session = AiohttpSession(api=TelegramAPIServer.from_base(cfg.API_BASE_URL)) if cfg.API_BASE_URL else None
+bot = Bot(token=cfg.BOT_TOKEN, session=session)
+bot.session.middleware(rate_limiter)
+bot.session.middleware(ApiMetricsMiddleware())
 dp = Dispatcher()
+instrument_engine(engine)
 
 START_TIME = datetime.utcnow()
 
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+for _name, _observer in dp.observers.items():
+    if _name not in ("update", "error"):
+        _observer.middleware(HandlerMetricsMiddleware())
+        _observer.middleware(ProfilerMiddleware())
+
+# Счётчики активности видят все сообщения, поэтому идут до фильтра команд
+dp.message.outer_middleware(ActivityMiddleware())
+dp.message.outer_middleware(UsernamesMiddleware())
+# Классификация текста команды выполняется один раз на сообщение
+dp.message.outer_middleware(CommandsMiddleware())
+
 dp.include_router(start_router)
 dp.include_router(roles_router)
 dp.include_router(nicks_router)
@@ -34,6 +68,7 @@ dp.include_router(raven_router)
 dp.include_router(moderation_router)
 dp.include_router(ping_router)
 dp.include_router(new_year_router)
+dp.include_router(members_router)
 
 
 @dp.my_chat_member()
@@ -45,47 +80,20 @@ async def on_my_chat_member(update: types.ChatMemberUpdated):
         if chat is None:
             return
 
-        async with AsyncSessionLocal() as session:
-            q = await session.execute(select(Chat).where(Chat.id == chat.id))
-            ch = q.scalars().first()
-            if not ch:
-                ch = Chat(id=chat.id)
-                session.add(ch)
-                await session.commit()
-
-        try:
-            admins = await bot.get_chat_administrators(chat.id)
-        except Exception as e:
-            logger.exception("Could not get chat administrators for chat %s: %s", chat.id, e)
+        # бота удалили или запретили ему писать — рассылки этот чат пропускают
+        active = update.new_chat_member.status not in ("left", "kicked")
+        await known_chats.set_active(chat.id, active)
+        if not active:
             return
 
-        owner = None
-        for a in admins:
-
-            if getattr(a, "status", "").lower() == "creator":
-                owner = a.user
-                break
-
-        if owner:
-            async with AsyncSessionLocal() as session:
-                q = await session.execute(select(RoleAssignment).where(RoleAssignment.chat_id == chat.id, RoleAssignment.user_id == owner.id))
-                existing = q.scalars().first()
-                if existing:
-                    existing.role_id = 5
-                    session.add(existing)
-                else:
-                    ra = RoleAssignment(chat_id=chat.id, user_id=owner.id, role_id=5, assigned_by=None)
-                    session.add(ra)
-                await session.commit()
-                logger.info("Assigned owner role in chat %s to user %s", chat.id, owner.id)
+        # владелец и админы чата получают роли сразу, не дожидаясь планового обхода
+        chat_info.invalidate(chat.id)
+        await admin_sync.sync_chat(bot, chat.id)
     except Exception as e:
         logger.exception("Error in on_my_chat_member: %s", e)
 
 
-async def main():
-
-    await init_db()
-
+async def setup_bot():
     commands = [
         BotCommand(command="start", description="Запустить бота"),
         BotCommand(command="admins", description="Показать список админов"),
@@ -93,9 +101,40 @@ async def main():
     ]
     await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
 
+
+async def main():
+
+    await init_db()
+    expiry.start()
+    activity.start()
+    known_chats.start()
+    members.start()
+    usernames.start()
+    latency.start(bot)
+    admin_sync.start(bot)
+    await broadcasts.resume(bot)
+    metrics_runner = await start_metrics_server()
+    await setup_bot()
+
     try:
-        await dp.start_polling(bot)
+        if cfg.RUN_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # getUpdates не работает, пока у бота установлен webhook
+            await bot.delete_webhook()
+            # chat_member приходит только по явной подписке; список собирается по хендлерам
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await broadcasts.stop()
+        await admin_sync.stop()
+        await expiry.stop()
+        await activity.stop()
+        await known_chats.stop()
+        await members.stop()
+        await usernames.stop()
+        await latency.stop()
         await bot.session.close()
 
 
@@ -106,7 +145,11 @@ if __name__ == "__main__":
     import os
 
     try:
-        asyncio.run(main())
+        if cfg.SHARD_WORKERS > 1:
+            from sharding import run_front
+            asyncio.run(run_front(bot, dp, setup_bot))
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
 
         sys.stderr.write("\nОстановка бота...\n")
@@ -0,0 +1,66 @@
+import re
+from typing import Optional
+
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+# Таблица триггеров текстовых команд. Порядок важен: он повторяет порядок
+# подключения роутеров и хендлеров в bot.py, поэтому при пересечении
+# шаблонов (например, "снять") побеждает тот же хендлер, что и раньше.
+TRIGGERS = (
+    ("start", r"/start(?:@\w+)?(?=\s|$)"),
+    ("staff_list", r"(?:\?админы?|админы|admins|/staff|/admins|список администрации)$"),
+    ("promote", r"[+!/]?(?:админ|назначить|повысить|setrole|promote)\b"),
+    ("demote", r"[+!/]?(?:снять|разжаловать|demote|unrole)\b"),
+    ("del_nick", r"-ник\b"),
+    ("set_nick", r"\+ник\b|ник\s+\S"),
+    ("get_nick", r"\??ник\b"),
+    ("warn", r"\+?(?:пред|варн)\b"),
+    ("unwarn", r"(?:-варн|-пред|снять)\b"),
+    ("list_warns", r"\?(?:пред|варн)(?:\s+\d+)?$"),
+    ("send_raven_bot", r"/send_raven_bot(?:@\w+)?(?=\s|$)"),
+    ("mass_mute", r"(?:масс ?мут|mass_?mute)\b"),
+    ("mass_ban", r"(?:масс ?бан|mass_?ban)\b"),
+    ("mass_kick", r"(?:масс ?кик|mass_?kick)\b"),
+    ("list_mutes", r"(?:мутлист|муты|мут лист|mutelist|/мутлист|/mutelist|\?mute|\?мут)(?: |$)"),
+    ("mute", r"(?:\+?мут|\+?замутить|mute)\b"),
+    ("unmute", r"(?:-мут|размутить|размут|unmute)\b"),
+    ("list_bans", r"(?:список банов|бан лист|банлист|banlist|ban list|\?баны)"),
+    ("ban", r"(?:\+бан|\+?ban|бан)\b"),
+    ("unban", r"(?:-бан|-?unban|разбан|разблокировать)\b"),
+    ("kick", r"(?:\+кик|кик|кикнуть|kick|kicked)\b"),
+    ("ping", r"(?:ping|пинг)$"),
+    ("ping_variants", r"ping "),
+    ("new_year", r"(?:нг|до нг|до нового года)$"),
+)
+
+# Один общий регэксп: альтернативы проверяются слева направо,
+# а имя сработавшей группы и есть ключ команды.
+_TRIGGERS_RE = re.compile(
+    "|".join(f"(?P<{key}>{pattern})" for key, pattern in TRIGGERS),
+    re.IGNORECASE,
+)
+
+
+def classify(text: Optional[str]) -> Optional[str]:
+    """
+    Возвращает ключ команды из TRIGGERS или None, если текст не является командой.
+    """
+    if not text:
+        return None
+    m = _TRIGGERS_RE.match(text.strip())
+    if not m:
+        return None
+    return m.lastgroup
+
+
+class Trigger(Filter):
+    """
+    Фильтр хендлера по ключу, который CommandsMiddleware положил в data["trigger"].
+    """
+
+    def __init__(self, *keys: str):
+        self.keys = frozenset(keys)
+
+    async def __call__(self, message: Message, trigger: Optional[str] = None) -> bool:
+        return trigger in self.keys
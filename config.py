@@ -12,8 +12,101 @@ class Config:
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///woxl.db")
     PARSE_MODE: str = "HTML"
 
+    # Профиль SQLite: PRAGMA для каждого соединения (пустое значение — не трогать)
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: str = os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    SQLITE_CACHE_SIZE: str = os.getenv("SQLITE_CACHE_SIZE", "-20000")
+    SQLITE_MMAP_SIZE: str = os.getenv("SQLITE_MMAP_SIZE", "268435456")
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+    # Пул соединений
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
     CREATOR_IDS_RAW: str = os.getenv("CREATOR_IDS", "")
 
+    # Адрес Bot API; пусто — api.telegram.org (для своего сервера или bench/fake_api.py)
+    API_BASE_URL: str = os.getenv("API_BASE_URL", "")
+
+    # Способ получения обновлений: polling или webhook
+    RUN_MODE: str = os.getenv("RUN_MODE", "polling")
+    WEBHOOK_BASE_URL: str = os.getenv("WEBHOOK_BASE_URL", "")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_MAX_INFLIGHT: int = int(os.getenv("WEBHOOK_MAX_INFLIGHT", "100"))
+
+    # Метрики в формате Prometheus (порт 0 — не поднимать эндпоинт)
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9108"))
+
+    # Задержка Bot API для ping: размер буфера замеров и период пробного запроса без трафика
+    LATENCY_SAMPLES: int = int(os.getenv("LATENCY_SAMPLES", "500"))
+    LATENCY_PROBE_INTERVAL: float = float(os.getenv("LATENCY_PROBE_INTERVAL", "30"))
+
+    # Профилировщик хендлеров (ping profile)
+    PROFILER_INTERVAL_MS: float = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+    PROFILER_MAX_SECONDS: float = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+
+    # Как часто записывать новые чаты в таблицу chats
+    CHATS_FLUSH_INTERVAL: float = float(os.getenv("CHATS_FLUSH_INTERVAL", "2"))
+
+    # Массовые бан/мут/кик: предел целей за команду и число одновременных запросов к API
+    MASS_ACTION_MAX_TARGETS: int = int(os.getenv("MASS_ACTION_MAX_TARGETS", "500"))
+    MASS_ACTION_CONCURRENCY: int = int(os.getenv("MASS_ACTION_CONCURRENCY", "10"))
+
+    # Рассылка по всем чатам
+    BROADCAST_CHUNK_SIZE: int = int(os.getenv("BROADCAST_CHUNK_SIZE", "100"))
+    BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+
+    # Счётчики активности: как часто сбрасывать их в activity_daily
+    ACTIVITY_FLUSH_INTERVAL: float = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+
+    # Запуск в несколько процессов: 1 — один процесс без шардирования
+    SHARD_WORKERS: int = int(os.getenv("SHARD_WORKERS", "1"))
+    SHARD_PORT: int = int(os.getenv("SHARD_PORT", "0"))
+    SHARD_MAX_PENDING: int = int(os.getenv("SHARD_MAX_PENDING", "1000"))
+    SHARD_STATS_INTERVAL: float = float(os.getenv("SHARD_STATS_INTERVAL", "5"))
+
+    # Синхронизация администраторов чатов из Telegram: период обхода всех чатов и параллельность
+    ADMIN_SYNC_INTERVAL: float = float(os.getenv("ADMIN_SYNC_INTERVAL", "3600"))
+    ADMIN_SYNC_CONCURRENCY: int = int(os.getenv("ADMIN_SYNC_CONCURRENCY", "5"))
+    # сколько ждать синхронизации ещё не синхронизированного чата при проверке прав
+    ADMIN_SYNC_WAIT: float = float(os.getenv("ADMIN_SYNC_WAIT", "5"))
+
+    # Участники чатов: размер кэша статусов и как часто сбрасывать изменения в chat_members
+    MEMBERS_CACHE_SIZE: int = int(os.getenv("MEMBERS_CACHE_SIZE", "100000"))
+    MEMBERS_FLUSH_INTERVAL: float = float(os.getenv("MEMBERS_FLUSH_INTERVAL", "2"))
+
+    # Индекс @username -> id: сколько имён держать в памяти и как часто писать новые в БД
+    USERNAMES_CACHE_SIZE: int = int(os.getenv("USERNAMES_CACHE_SIZE", "200000"))
+    USERNAMES_FLUSH_INTERVAL: float = float(os.getenv("USERNAMES_FLUSH_INTERVAL", "5"))
+
+    # Сведения о чатах из Bot API (ping chat, синхронизация админов): время жизни и размер кэша
+    CHAT_INFO_TTL: float = float(os.getenv("CHAT_INFO_TTL", "60"))
+    CHAT_INFO_CACHE_SIZE: int = int(os.getenv("CHAT_INFO_CACHE_SIZE", "5000"))
+
+    # Готовые списки администрации (/admins): сколько чатов держать и сколько секунд
+    STAFF_CACHE_MAX_CHATS: int = int(os.getenv("STAFF_CACHE_MAX_CHATS", "1000"))
+    STAFF_CACHE_TTL: float = float(os.getenv("STAFF_CACHE_TTL", "600"))
+
+    # Сколько чатов держать в кэше ролей
+    ROLE_CACHE_MAX_CHATS: int = int(os.getenv("ROLE_CACHE_MAX_CHATS", "1000"))
+
+    # Лимиты исходящих запросов к Bot API
+    RATE_LIMIT_GLOBAL_PER_SEC: float = float(os.getenv("RATE_LIMIT_GLOBAL_PER_SEC", "30"))
+    RATE_LIMIT_GROUP_PER_MIN: float = float(os.getenv("RATE_LIMIT_GROUP_PER_MIN", "20"))
+    RATE_LIMIT_PRIVATE_PER_SEC: float = float(os.getenv("RATE_LIMIT_PRIVATE_PER_SEC", "1"))
+    RATE_LIMIT_MAX_RETRIES: int = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+
+    # Кэш отображаемых имён пользователей
+    NAMES_CACHE_SIZE: int = int(os.getenv("NAMES_CACHE_SIZE", "10000"))
+    NAMES_CACHE_TTL: int = int(os.getenv("NAMES_CACHE_TTL", "300"))
+    NAMES_API_CONCURRENCY: int = int(os.getenv("NAMES_API_CONCURRENCY", "5"))
+
     @property
     def CREATOR_IDS(self):
         s = self.CREATOR_IDS_RAW or ""
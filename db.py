@@ -1,12 +1,72 @@
+from sqlalchemy import event, insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import cfg
+from migrations import apply_migrations
 
-engine = create_async_engine(cfg.DATABASE_URL, echo=False, future=True)
+
+def sqlite_pragmas(config=cfg):
+    """
+    PRAGMA, которые выставляются на каждом новом соединении с SQLite.
+    Пустое значение в конфиге отключает соответствующую настройку.
+    """
+    pragmas = (
+        ("journal_mode", config.SQLITE_JOURNAL_MODE),
+        ("synchronous", config.SQLITE_SYNCHRONOUS),
+        ("busy_timeout", config.SQLITE_BUSY_TIMEOUT_MS),
+        ("cache_size", config.SQLITE_CACHE_SIZE),
+        ("mmap_size", config.SQLITE_MMAP_SIZE),
+        ("temp_store", config.SQLITE_TEMP_STORE),
+    )
+    return [(name, value) for name, value in pragmas if str(value).strip() != ""]
+
+
+def make_engine(url: str, pragmas=None, config=cfg):
+    options = {"echo": False, "future": True}
+    # in-memory SQLite живёт в одном соединении (StaticPool), размер пула к нему не применим
+    parsed = make_url(url)
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        # файловый SQLite в SQLAlchemy < 2.0 по умолчанию получает NullPool без размеров — пул задаём явно
+        options.update(
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+        )
+    new_engine = create_async_engine(url, **options)
+
+    if pragmas and new_engine.dialect.name == "sqlite":
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return new_engine
+
+
+engine = make_engine(cfg.DATABASE_URL, sqlite_pragmas())
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
+
+def upsert_insert(model):
+    """
+    INSERT с поддержкой on_conflict_do_update/on_conflict_do_nothing для текущего диалекта.
+    """
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(model)
+    return dialect_insert(model)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(apply_migrations)
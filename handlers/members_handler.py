@@ -0,0 +1,23 @@
+from aiogram import Bot, Router
+from aiogram.types import ChatMemberUpdated
+from services.admin_sync_service import admin_sync
+from services.chat_info_service import chat_info
+from services.members_service import members
+from services.usernames_service import usernames
+
+router = Router()
+
+ADMIN_STATUSES = ("creator", "administrator")
+
+
+@router.chat_member()
+async def on_chat_member(event: ChatMemberUpdated, bot: Bot):
+    # Telegram присылает chat_member, только если тип есть в allowed_updates;
+    # его туда добавляет dp.resolve_used_update_types() по этому хендлеру
+    members.on_update(event)
+    user = event.new_chat_member.user
+    usernames.record(user.id, user.username)
+    # назначение или снятие админа в Telegram сразу попадает в роли
+    if event.old_chat_member.status in ADMIN_STATUSES or event.new_chat_member.status in ADMIN_STATUSES:
+        chat_info.invalidate(event.chat.id, "admins")
+        admin_sync.sync_chat(bot, event.chat.id)
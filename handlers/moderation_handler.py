@@ -1,32 +1,27 @@
 # handlers/moderation_handler.py
+import asyncio
 from datetime import datetime
 from aiogram import Router
 from aiogram.types import Message, CallbackQuery, ChatPermissions
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, update
 from db import AsyncSessionLocal
-from models import Mute, Ban, RoleAssignment, Nick
+from models import Mute, Ban
 from utils import parse_duration, format_timedelta_remaining
 from keyboards import page_kb
+from pagination import fetch_page, parse_page_callback
 from config import cfg
-import re
+from commands import Trigger
+from services.roles_service import role_cache
+from services.admin_sync_service import admin_sync
+from services.members_service import members, PRESENT_STATUSES
+from services.usernames_service import usernames
+from services.names_service import format_user_link, format_user_links
+from services.expiry_service import expiry
 
 router = Router()
 
 # ----------------- helpers -----------------
 
-async def format_user_link(chat_id: int, user_id: int, bot, session):
-    q = await session.execute(select(Nick).where(Nick.chat_id == chat_id, Nick.user_id == user_id))
-    nick = q.scalars().first()
-    if nick:
-        display = nick.nick
-    else:
-        try:
-            member = await bot.get_chat_member(chat_id, user_id)
-            display = member.user.full_name
-        except Exception:
-            display = str(user_id)
-    return f'<a href="tg://user?id={user_id}">{display}</a>'
-
 async def resolve_target_from_message(message: Message):
     if message.reply_to_message and message.reply_to_message.from_user:
         u = message.reply_to_message.from_user
@@ -46,167 +41,143 @@ async def resolve_target_from_message(message: Message):
     return None, None
 
 async def get_effective_role(chat_id: int, user_id_or_token, bot):
-    if isinstance(user_id_or_token, int):
-        async with AsyncSessionLocal() as session:
-            q = await session.execute(select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == user_id_or_token))
-            ra = q.scalars().first()
-            if ra:
-                return ra.role_id
-    # try to resolve via telegram (if we have numeric id)
-    try:
-        if isinstance(user_id_or_token, int):
-            member = await bot.get_chat_member(chat_id, user_id_or_token)
-            status = getattr(member, "status", "").lower()
-            if status == "creator":
-                return 5
-            if status == "administrator":
-                return 4
-            return 0
-    except Exception:
-        pass
-    return None
+    if not isinstance(user_id_or_token, int):
+        return None
+    return await admin_sync.role_of(bot, chat_id, user_id_or_token)
 
 async def try_resolve_username_to_id(chat_id: int, username_token: str, bot):
-    name = username_token.lstrip("@")
-    try:
-        # best-effort: try to get chat member by username; some Telegram API variants allow username
-        member = await bot.get_chat_member(chat_id, name)
-        return member.user.id, member.user.full_name
-    except Exception:
-        try:
-            member = await bot.get_chat_member(chat_id, f"@{name}")
-            return member.user.id, member.user.full_name
-        except Exception:
-            return None, None
+    # Bot API не ищет пользователей по username — только локальный индекс
+    user_id = await usernames.resolve(username_token)
+    if user_id is None:
+        return None, None
+    return user_id, username_token
 
 async def is_user_present_in_chat(chat_id: int, user_id: int, bot):
     """
     Возвращает (present: bool, status: str | None)
     present = False если статус 'left' или 'kicked' или если произошла ошибка при получении.
+    Статус берётся из members (обновления chat_member), API — только для неизвестных.
     """
-    try:
-        member = await bot.get_chat_member(chat_id, user_id)
-        status = getattr(member, "status", "").lower()
-        if status in ("left", "kicked"):
-            return False, status
-        return True, status
-    except Exception:
-        # Если не удалось получить — считаем, что пользователь не подтверждён (без выдачи наказаний)
-        return False, None
-
-# ----------------- list mutes -----------------
+    status = await members.get_status(chat_id, user_id)
+    if status is None:
+        try:
+            member = await bot.get_chat_member(chat_id, user_id)
+        except Exception:
+            # Если не удалось получить — считаем, что пользователь не подтверждён (без выдачи наказаний)
+            return False, None
+        status = members.record_member(chat_id, member)
+    return status in PRESENT_STATUSES, status
+
+# Тексты списков мутов и банов отличаются только подписями
+LIST_LABELS = {
+    "mutes": {
+        "model": Mute,
+        "header": "Активные муты",
+        "total": "Всего активных мутов",
+        "items": "Список мутов",
+        "none_user": "не имеет активных мутов",
+        "none_chat": "в чате нет активных мутов",
+    },
+    "bans": {
+        "model": Ban,
+        "header": "Активные баны",
+        "total": "Всего активных банов",
+        "items": "Список банов",
+        "none_user": "не имеет активных банов",
+        "none_chat": "в чате нет активных банов",
+    },
+}
+
+async def fetch_list_page(kind: str, chat_id: int, target_user_id, page: int, direction=None, cursor=None):
+    model = LIST_LABELS[kind]["model"]
+    conditions = [model.chat_id == chat_id, model.active == True]
+    if target_user_id:
+        conditions.append(model.user_id == target_user_id)
+    async with AsyncSessionLocal() as session:
+        return await fetch_page(session, model, conditions, page, direction, cursor)
 
-@router.message(lambda message: message.text and (
-    message.text.strip().lower() in ("мутлист","муты","мут лист","mutelist","/мутлист","/mutelist","?mute","?мут")
-    or message.text.strip().lower().startswith(("мутлист ","муты ","мут лист ","mutelist ","/мутлист ","/mutelist ","?mute ","?мут "))
-))
-async def cmd_list_mutes(message: Message):
+async def render_list_page(kind: str, chat_id: int, target_user_id, result, bot):
+    labels = LIST_LABELS[kind]
+    text_lines = []
+    header = labels["header"]
+    if target_user_id:
+        target_display = await format_user_link(chat_id, target_user_id, bot)
+        header = f"{labels['header']} для {target_display}"
+    text_lines.append(f"<b>{header}</b>")
+    text_lines.append(f"┌─ <b>{labels['total']}:</b> {result.total}")
+    text_lines.append(f"├─ <b>{labels['items']}:</b>")
+    links = await format_user_links(
+        chat_id, [uid for r in result.rows for uid in (r.user_id, r.issued_by) if uid], bot)
+    for idx, r in enumerate(result.rows, start=result.start + 1):
+        rem = format_timedelta_remaining(r.until) if r.until else "без срока"
+        link = links[r.user_id]
+        issuer_link = links[r.issued_by] if r.issued_by else "Система"
+        created = r.created_at.strftime("%d.%m.%Y %H:%M") if getattr(r, "created_at", None) else ""
+        text_lines.append(f"│   {idx}. {link} — <b>за</b>: {r.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}")
+    text_lines.append(f"└─ <b>Страница:</b> {result.page}/{result.total_pages}")
+    kb = page_kb(result.page, prefix=kind, prev_cursor=result.prev_cursor, next_cursor=result.next_cursor)
+    return "\n".join(text_lines), kb
+
+async def reply_list(kind: str, message: Message):
     parts = message.text.strip().split()
     page = 1
     if len(parts) >= 2 and parts[1].isdigit():
         page = max(1, int(parts[1]))
-    per_page = 10
     chat_id = message.chat.id
     target_user_id = None
-    target_display = None
     if message.reply_to_message and message.reply_to_message.from_user:
         target_user_id = message.reply_to_message.from_user.id
-    async with AsyncSessionLocal() as session:
-        if target_user_id:
-            q = await session.execute(select(Mute).where(Mute.chat_id == chat_id, Mute.active == True, Mute.user_id == target_user_id).order_by(Mute.created_at.desc()))
-            mutes = q.scalars().all()
-            target_display = await format_user_link(chat_id, target_user_id, message.bot, session)
-        else:
-            q = await session.execute(select(Mute).where(Mute.chat_id == chat_id, Mute.active == True).order_by(Mute.created_at.desc()))
-            mutes = q.scalars().all()
-    total = len(mutes)
-    if total == 0:
+    result = await fetch_list_page(kind, chat_id, target_user_id, page)
+    if result is None:
         if target_user_id:
-            await message.reply(f"Информация: {target_display} не имеет активных мутов.", parse_mode="HTML")
+            target_display = await format_user_link(chat_id, target_user_id, message.bot)
+            await message.reply(f"Информация: {target_display} {LIST_LABELS[kind]['none_user']}.", parse_mode="HTML")
         else:
-            await message.reply("Информация: в чате нет активных мутов.", parse_mode="HTML")
+            await message.reply(f"Информация: {LIST_LABELS[kind]['none_chat']}.", parse_mode="HTML")
         return
-    total_pages = max(1, (total + per_page - 1) // per_page)
-    if page > total_pages:
-        page = total_pages
-    start = (page - 1) * per_page
-    page_mutes = mutes[start:start + per_page]
-    text_lines = []
-    header = "Активные муты"
-    if target_user_id:
-        header = f"Активные муты для {target_display}"
-    text_lines.append(f"<b>{header}</b>")
-    text_lines.append(f"┌─ <b>Всего активных мутов:</b> {total}")
-    text_lines.append("├─ <b>Список мутов:</b>")
-    async with AsyncSessionLocal() as session:
-        for idx, m in enumerate(page_mutes, start=start + 1):
-            rem = format_timedelta_remaining(m.until) if m.until else "без срока"
-            link = await format_user_link(chat_id, m.user_id, message.bot, session)
-            issuer_link = await format_user_link(chat_id, m.issued_by, message.bot, session) if m.issued_by else "Система"
-            created = m.created_at.strftime("%d.%m.%Y %H:%M") if getattr(m, "created_at", None) else ""
-            text_lines.append(f"│   {idx}. {link} — <b>за</b>: {m.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}")
-    text_lines.append(f"└─ <b>Страница:</b> {page}/{total_pages}")
-    kb = page_kb(page, prefix="mutes")
-    await message.reply("\n".join(text_lines), reply_markup=kb, parse_mode="HTML")
+    text, kb = await render_list_page(kind, chat_id, target_user_id, result, message.bot)
+    await message.reply(text, reply_markup=kb, parse_mode="HTML")
 
-@router.callback_query(lambda c: c.data and c.data.startswith("mutes:"))
-async def cb_mutes_page(query: CallbackQuery):
-    parts = query.data.split(":")
-    try:
-        page = int(parts[1])
-    except Exception:
-        page = 1
-    if page < 1:
-        page = 1
-    per_page = 10
+async def edit_list(kind: str, query: CallbackQuery):
+    page, direction, cursor = parse_page_callback(query.data)
     chat_id = query.message.chat.id
     target_user_id = None
-    target_display = None
     if query.message.reply_to_message and query.message.reply_to_message.from_user:
         target_user_id = query.message.reply_to_message.from_user.id
-    async with AsyncSessionLocal() as session:
-        if target_user_id:
-            q = await session.execute(select(Mute).where(Mute.chat_id == chat_id, Mute.active == True, Mute.user_id == target_user_id).order_by(Mute.created_at.desc()))
-            mutes = q.scalars().all()
-            target_display = await format_user_link(chat_id, target_user_id, query.bot, session)
-        else:
-            q = await session.execute(select(Mute).where(Mute.chat_id == chat_id, Mute.active == True).order_by(Mute.created_at.desc()))
-            mutes = q.scalars().all()
-    total = len(mutes)
-    if total == 0:
+    result = await fetch_list_page(kind, chat_id, target_user_id, page, direction, cursor)
+    if result is None:
         await query.answer()
         return
-    total_pages = max(1, (total + per_page - 1) // per_page)
-    if page > total_pages:
-        page = total_pages
-    start = (page - 1) * per_page
-    page_mutes = mutes[start:start + per_page]
-    text_lines = []
-    header = "Активные муты"
-    if target_user_id:
-        header = f"Активные муты для {target_display}"
-    text_lines.append(f"<b>{header}</b>")
-    text_lines.append(f"┌─ <b>Всего активных мутов:</b> {total}")
-    text_lines.append("├─ <b>Список мутов:</b>")
-    async with AsyncSessionLocal() as session:
-        for idx, m in enumerate(page_mutes, start=start + 1):
-            rem = format_timedelta_remaining(m.until) if m.until else "без срока"
-            link = await format_user_link(chat_id, m.user_id, query.bot, session)
-            issuer_link = await format_user_link(chat_id, m.issued_by, query.bot, session) if m.issued_by else "Система"
-            created = m.created_at.strftime("%d.%m.%Y %H:%M") if getattr(m, "created_at", None) else ""
-            text_lines.append(f"│   {idx}. {link} — <b>за</b>: {m.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}")
-    text_lines.append(f"└─ <b>Страница:</b> {page}/{total_pages}")
-    kb = page_kb(page, prefix="mutes")
+    text, kb = await render_list_page(kind, chat_id, target_user_id, result, query.bot)
     try:
-        await query.message.edit_text("\n".join(text_lines), reply_markup=kb, parse_mode="HTML")
+        await query.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
     except Exception:
         await query.answer("Не удалось обновить сообщение.", show_alert=False)
         return
     await query.answer()
 
+# ----------------- list mutes -----------------
+
+@router.message(Trigger("list_mutes"))
+async def cmd_list_mutes(message: Message):
+    await reply_list("mutes", message)
+
+@router.callback_query(lambda c: c.data and c.data.startswith("mutes:"))
+async def cb_mutes_page(query: CallbackQuery):
+    await edit_list("mutes", query)
+
 # ----------------- mute -----------------
 
-@router.message(lambda message: message.text and re.match(r"^(?:\+?мут|\+?замутить|mute|замутить)\b", message.text.strip(), re.IGNORECASE))
+MUTED_PERMISSIONS = ChatPermissions(
+    can_send_messages=False,
+    can_send_media_messages=False,
+    can_send_polls=False,
+    can_send_other_messages=False,
+    can_add_web_page_previews=False,
+    can_send_documents=False
+)
+
+@router.message(Trigger("mute"))
 async def cmd_mute(message: Message):
     parts = message.text.strip().split(maxsplit=2)
     issuer = message.from_user.id
@@ -220,7 +191,7 @@ async def cmd_mute(message: Message):
     if isinstance(target, str) and target.startswith("@"):
         uid, name = await try_resolve_username_to_id(chat_id, target, message.bot)
         if not uid:
-            await message.reply("<b>Пожалуйста, ответьте на сообщение пользователя или укажите его id (без @username).</b>", parse_mode="HTML")
+            await message.reply(f"<b>Пользователь {target} не найден: бот ещё не видел его сообщений. Ответьте на сообщение пользователя или укажите его id.</b>", parse_mode="HTML")
             return
         target = uid
 
@@ -230,8 +201,7 @@ async def cmd_mute(message: Message):
 
     # Проверка, присутствует ли пользователь в чате (не вышел и не кикнут)
     present, status = await is_user_present_in_chat(chat_id, target, message.bot)
-    async with AsyncSessionLocal() as session:
-        link = await format_user_link(chat_id, target, message.bot, session)
+    link = await format_user_link(chat_id, target, message.bot)
     if not present:
         await message.reply(f"<b>Невозможно выдать мут {link}: пользователь вышел или был удалён/забанен.</b>", parse_mode="HTML")
         return
@@ -272,26 +242,18 @@ async def cmd_mute(message: Message):
         session.add(m)
         await session.commit()
         await session.refresh(m)
+        expiry.schedule(Mute, m.id, until_dt)
         try:
-            perms = ChatPermissions(
-                can_send_messages=False,
-                can_send_media_messages=False,
-                can_send_polls=False,
-                can_send_other_messages=False,
-                can_add_web_page_previews=False,
-                can_send_documents=False
-            )
-            await message.bot.restrict_chat_member(chat_id, target, permissions=perms, until_date=until_dt)
+            await message.bot.restrict_chat_member(chat_id, target, permissions=MUTED_PERMISSIONS, until_date=until_dt)
         except Exception:
             pass
-        link = await format_user_link(chat_id, target, message.bot, session)
 
     until_text = until_dt.strftime("%H:%M:%S %d.%m.%Y") if until_dt else "без срока"
     await message.reply(f"<b>{link} временно ограничен в отправке сообщений до {until_text}.</b>\nПричина: {reason or 'Причина не указана'}", parse_mode="HTML")
 
 # ----------------- unmute -----------------
 
-@router.message(lambda message: message.text and re.match(r"^(-мут|размутить|размут|unmute)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("unmute"))
 async def cmd_unmute(message: Message):
     parts = message.text.strip().split(maxsplit=1)
     chat_id = message.chat.id
@@ -319,7 +281,7 @@ async def cmd_unmute(message: Message):
         stmt = select(Mute).where(Mute.chat_id == chat_id, Mute.user_id == target, Mute.active == True).order_by(desc(Mute.created_at)).limit(1)
         result = await session.execute(stmt)
         mute_to_remove = result.scalars().first()
-        link = await format_user_link(chat_id, target, message.bot, session)
+        link = await format_user_link(chat_id, target, message.bot)
         if mute_to_remove:
             mute_to_remove.active = False
             await session.commit()
@@ -341,114 +303,17 @@ async def cmd_unmute(message: Message):
 
 # ----------------- list bans -----------------
 
-@router.message(lambda message: message.text and (message.text.strip().lower().startswith(("список банов","бан лист","банлист","banlist","ban list","?баны")) or message.text.strip().lower() == "список банов" or message.text.strip().lower() == "?баны"))
+@router.message(Trigger("list_bans"))
 async def cmd_list_bans(message: Message):
-    parts = message.text.strip().split()
-    page = 1
-    if len(parts) >= 2 and parts[1].isdigit():
-        page = max(1, int(parts[1]))
-    per_page = 10
-    chat_id = message.chat.id
-    target_user_id = None
-    target_display = None
-    if message.reply_to_message and message.reply_to_message.from_user:
-        target_user_id = message.reply_to_message.from_user.id
-    async with AsyncSessionLocal() as session:
-        if target_user_id:
-            q = await session.execute(select(Ban).where(Ban.chat_id == chat_id, Ban.active == True, Ban.user_id == target_user_id).order_by(Ban.created_at.desc()))
-            bans = q.scalars().all()
-            target_display = await format_user_link(chat_id, target_user_id, message.bot, session)
-        else:
-            q = await session.execute(select(Ban).where(Ban.chat_id == chat_id, Ban.active == True).order_by(Ban.created_at.desc()))
-            bans = q.scalars().all()
-    total = len(bans)
-    if total == 0:
-        if target_user_id:
-            await message.reply(f"Информация: {target_display} не имеет активных банов.", parse_mode="HTML")
-        else:
-            await message.reply("Информация: в чате нет активных банов.", parse_mode="HTML")
-        return
-    total_pages = max(1, (total + per_page - 1) // per_page)
-    if page > total_pages:
-        page = total_pages
-    start = (page - 1) * per_page
-    page_bans = bans[start:start + per_page]
-    text_lines = []
-    header = "Активные баны"
-    if target_user_id:
-        header = f"Активные баны для {target_display}"
-    text_lines.append(f"<b>{header}</b>")
-    text_lines.append(f"┌─ <b>Всего активных банов:</b> {total}")
-    text_lines.append("├─ <b>Список банов:</b>")
-    async with AsyncSessionLocal() as session:
-        for idx, b in enumerate(page_bans, start=start + 1):
-            rem = format_timedelta_remaining(b.until) if b.until else "без срока"
-            link = await format_user_link(chat_id, b.user_id, message.bot, session)
-            issuer_link = await format_user_link(chat_id, b.issued_by, message.bot, session) if b.issued_by else "Система"
-            created = b.created_at.strftime("%d.%m.%Y %H:%M") if getattr(b, "created_at", None) else ""
-            text_lines.append(f"│   {idx}. {link} — <b>за</b>: {b.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}")
-    text_lines.append(f"└─ <b>Страница:</b> {page}/{total_pages}")
-    kb = page_kb(page, prefix="bans")
-    await message.reply("\n".join(text_lines), reply_markup=kb, parse_mode="HTML")
+    await reply_list("bans", message)
 
 @router.callback_query(lambda c: c.data and c.data.startswith("bans:"))
 async def cb_bans_page(query: CallbackQuery):
-    parts = query.data.split(":")
-    try:
-        page = int(parts[1])
-    except Exception:
-        page = 1
-    if page < 1:
-        page = 1
-    per_page = 10
-    chat_id = query.message.chat.id
-    target_user_id = None
-    target_display = None
-    if query.message.reply_to_message and query.message.reply_to_message.from_user:
-        target_user_id = query.message.reply_to_message.from_user.id
-    async with AsyncSessionLocal() as session:
-        if target_user_id:
-            q = await session.execute(select(Ban).where(Ban.chat_id == chat_id, Ban.active == True, Ban.user_id == target_user_id).order_by(Ban.created_at.desc()))
-            bans = q.scalars().all()
-            target_display = await format_user_link(chat_id, target_user_id, query.bot, session)
-        else:
-            q = await session.execute(select(Ban).where(Ban.chat_id == chat_id, Ban.active == True).order_by(Ban.created_at.desc()))
-            bans = q.scalars().all()
-    total = len(bans)
-    if total == 0:
-        await query.answer()
-        return
-    total_pages = max(1, (total + per_page - 1) // per_page)
-    if page > total_pages:
-        page = total_pages
-    start = (page - 1) * per_page
-    page_bans = bans[start:start + per_page]
-    text_lines = []
-    header = "Активные баны"
-    if target_user_id:
-        header = f"Активные баны для {target_display}"
-    text_lines.append(f"<b>{header}</b>")
-    text_lines.append(f"┌─ <b>Всего активных банов:</b> {total}")
-    text_lines.append("├─ <b>Список банов:</b>")
-    async with AsyncSessionLocal() as session:
-        for idx, b in enumerate(page_bans, start=start + 1):
-            rem = format_timedelta_remaining(b.until) if b.until else "без срока"
-            link = await format_user_link(chat_id, b.user_id, query.bot, session)
-            issuer_link = await format_user_link(chat_id, b.issued_by, query.bot, session) if b.issued_by else "Система"
-            created = b.created_at.strftime("%d.%m.%Y %H:%M") if getattr(b, "created_at", None) else ""
-            text_lines.append(f"│   {idx}. {link} — <b>за</b>: {b.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}")
-    text_lines.append(f"└─ <b>Страница:</b> {page}/{total_pages}")
-    kb = page_kb(page, prefix="bans")
-    try:
-        await query.message.edit_text("\n".join(text_lines), reply_markup=kb, parse_mode="HTML")
-    except Exception:
-        await query.answer("Не удалось обновить сообщение.", show_alert=False)
-        return
-    await query.answer()
+    await edit_list("bans", query)
 
 # ----------------- ban -----------------
 
-@router.message(lambda message: message.text and re.match(r"^(?:\+бан|\+?ban|бан)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("ban"))
 async def cmd_ban(message: Message):
     parts = message.text.strip().split(maxsplit=2)
     issuer = message.from_user.id
@@ -462,7 +327,7 @@ async def cmd_ban(message: Message):
     if isinstance(target, str) and target.startswith("@"):
         uid, name = await try_resolve_username_to_id(chat_id, target, message.bot)
         if not uid:
-            await message.reply("<b>Пожалуйста, ответьте на сообщение пользователя или укажите его id (без @username).</b>", parse_mode="HTML")
+            await message.reply(f"<b>Пользователь {target} не найден: бот ещё не видел его сообщений. Ответьте на сообщение пользователя или укажите его id.</b>", parse_mode="HTML")
             return
         target = uid
 
@@ -472,8 +337,7 @@ async def cmd_ban(message: Message):
 
     # Проверка, присутствует ли пользователь в чате (не вышел и не кикнут)
     present, status = await is_user_present_in_chat(chat_id, target, message.bot)
-    async with AsyncSessionLocal() as session:
-        link = await format_user_link(chat_id, target, message.bot, session)
+    link = await format_user_link(chat_id, target, message.bot)
     if not present:
         await message.reply(f"<b>Невозможно выдать бан {link}: пользователь вышел или уже удалён/забанен.</b>", parse_mode="HTML")
         return
@@ -514,17 +378,17 @@ async def cmd_ban(message: Message):
         session.add(b)
         await session.commit()
         await session.refresh(b)
+        expiry.schedule(Ban, b.id, until_dt)
         try:
             await message.bot.ban_chat_member(chat_id, target, until_date=until_dt)
         except Exception:
             pass
-        link = await format_user_link(chat_id, target, message.bot, session)
     until_text = until_dt.strftime("%H:%M:%S %d.%m.%Y") if until_dt else "без срока"
     await message.reply(f"<b>{link} заблокирован до {until_text}.</b>\nПричина: {reason or 'Причина не указана'}", parse_mode="HTML")
 
 # ----------------- unban -----------------
 
-@router.message(lambda message: message.text and re.match(r"^(-бан|-?unban|разбан|разблокировать)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("unban"))
 async def cmd_unban(message: Message):
     parts = message.text.strip().split(maxsplit=1)
     chat_id = message.chat.id
@@ -552,7 +416,7 @@ async def cmd_unban(message: Message):
         stmt = select(Ban).where(Ban.chat_id == chat_id, Ban.user_id == target, Ban.active == True).order_by(desc(Ban.created_at)).limit(1)
         result = await session.execute(stmt)
         ban_to_remove = result.scalars().first()
-        link = await format_user_link(chat_id, target, message.bot, session)
+        link = await format_user_link(chat_id, target, message.bot)
         if ban_to_remove:
             ban_to_remove.active = False
             await session.commit()
@@ -566,7 +430,7 @@ async def cmd_unban(message: Message):
 
 # ----------------- kick -----------------
 
-@router.message(lambda message: message.text and re.match(r"^(?:\+кик|кик|кикнуть|kick|kicked)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("kick"))
 async def cmd_kick(message: Message):
     parts = message.text.strip().split(maxsplit=1)
     issuer = message.from_user.id
@@ -593,17 +457,182 @@ async def cmd_kick(message: Message):
 
     # Проверка, присутствует ли пользователь (если он уже ушёл/кикнут, нет смысла кикать)
     present, status = await is_user_present_in_chat(chat_id, target, message.bot)
-    async with AsyncSessionLocal() as session:
-        link = await format_user_link(chat_id, target, message.bot, session)
+    link = await format_user_link(chat_id, target, message.bot)
     if not present:
         await message.reply(f"<b>Невозможно кикнуть {link}: пользователь уже вышел или был удалён/забанен.</b>", parse_mode="HTML")
         return
 
-    async with AsyncSessionLocal() as session:
-        try:
-            await message.bot.ban_chat_member(chat_id, target)
-            await message.bot.unban_chat_member(chat_id, target)
-        except Exception:
-            pass
-        link = await format_user_link(chat_id, target, message.bot, session)
+    try:
+        await message.bot.ban_chat_member(chat_id, target)
+        await message.bot.unban_chat_member(chat_id, target)
+    except Exception:
+        pass
     await message.reply(f"<b>{link} был удалён из группы.</b>", parse_mode="HTML")
+
+# ----------------- mass actions -----------------
+
+MASS_ACTIONS = {
+    # ключ: (минимальная роль, название в ответах)
+    "mass_mute": (2, "мут"),
+    "mass_ban": (3, "бан"),
+    "mass_kick": (5, "кик"),
+}
+
+# как часто обновлять сообщение с прогрессом: правки тоже упираются в лимит чата
+PROGRESS_EDIT_INTERVAL = 5.0
+
+
+async def parse_mass_targets(chat_id: int, tokens):
+    """
+    Разбирает цели массовой команды: id, @username или "новые <время>".
+    Возвращает (ids, нераспознанные @username, оставшиеся токены).
+    """
+    targets = []
+    unknown = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isdigit():
+            targets.append(int(token))
+        elif token.startswith("@"):
+            uid = await usernames.resolve(token)
+            if uid:
+                targets.append(uid)
+            else:
+                unknown.append(token)
+        elif token.lower() in ("новые", "new") and i + 1 < len(tokens) and parse_duration(tokens[i + 1]):
+            since = datetime.utcnow() - parse_duration(tokens[i + 1])
+            targets.extend(await members.joined_since(chat_id, since))
+            i += 1
+        else:
+            break
+        i += 1
+    return list(dict.fromkeys(targets)), unknown, tokens[i:]
+
+
+@router.message(Trigger(*MASS_ACTIONS))
+async def cmd_mass_action(message: Message, trigger: str):
+    min_role, title = MASS_ACTIONS[trigger]
+    chat_id = message.chat.id
+    issuer = message.from_user.id
+    bot = message.bot
+    role = await get_effective_role(chat_id, issuer, bot)
+    if role is None or role < min_role:
+        await message.reply(f"<b>Ошибка: у вас нет прав для массового {title}а.</b>", parse_mode="HTML")
+        return
+
+    tokens = message.text.strip().split()[1:]
+    # "масс бан ..." — название команды из двух слов
+    if tokens and tokens[0].lower() in ("мут", "бан", "кик"):
+        tokens = tokens[1:]
+    targets, unknown, rest = await parse_mass_targets(chat_id, tokens)
+    if not targets:
+        await message.reply(
+            "<b>ℹ️ Массовые команды:</b>\n"
+            f"<code>масс{title} id1 id2 @user [время] [причина]</code>\n"
+            f"<code>масс{title} новые 10м [время] [причина]</code> — все, кто вошёл за последние 10 минут",
+            parse_mode="HTML")
+        return
+
+    until_dt = None
+    if trigger != "mass_kick" and rest and parse_duration(rest[0]):
+        until_dt = datetime.now() + parse_duration(rest[0])
+        rest = rest[1:]
+    reason = " ".join(rest) or None
+
+    # администрацию, себя и бота массовые команды не трогают
+    staff = await role_cache.get_chat_roles(chat_id)
+    skipped = [uid for uid in targets if uid in staff or uid in (issuer, bot.id)]
+    targets = [uid for uid in targets if uid not in skipped]
+    dropped = max(0, len(targets) - cfg.MASS_ACTION_MAX_TARGETS)
+    targets = targets[:cfg.MASS_ACTION_MAX_TARGETS]
+    if not targets:
+        await message.reply("<b>Все указанные пользователи — администрация чата.</b>", parse_mode="HTML")
+        return
+
+    total = len(targets)
+    done = {"ok": 0, "failed": 0}
+    failed = []
+
+    def progress_text(finished: bool) -> str:
+        head = "✅ Готово" if finished else "⏳ Выполняется"
+        lines = [
+            f"<b>{head}: массовый {title}</b>",
+            f"├─ Обработано: {done['ok'] + done['failed']}/{total}",
+            f"├─ Успешно: {done['ok']}",
+            f"├─ Ошибок: {done['failed']}",
+        ]
+        if skipped:
+            lines.append(f"├─ Пропущено (администрация): {len(skipped)}")
+        if dropped:
+            lines.append(f"├─ Не обработано (больше {cfg.MASS_ACTION_MAX_TARGETS} за раз): {dropped}")
+        if unknown:
+            lines.append(f"├─ Не найдены: {', '.join(unknown)}")
+        if trigger != "mass_kick":
+            until_text = until_dt.strftime("%H:%M:%S %d.%m.%Y") if until_dt else "без срока"
+            lines.append(f"├─ До: {until_text}")
+        lines.append(f"└─ Причина: {reason or 'Причина не указана'}")
+        return "\n".join(lines)
+
+    progress = await message.reply(progress_text(False), parse_mode="HTML")
+
+    # все записи одной транзакцией
+    row_ids = {}
+    if trigger != "mass_kick":
+        model = Mute if trigger == "mass_mute" else Ban
+        async with AsyncSessionLocal() as session:
+            rows = [model(chat_id=chat_id, user_id=uid, issued_by=issuer, reason=reason, until=until_dt, active=True)
+                    for uid in targets]
+            session.add_all(rows)
+            await session.commit()
+        for row in rows:
+            row_ids[row.user_id] = row.id
+            expiry.schedule(model, row.id, until_dt)
+
+    async def act(uid: int):
+        if trigger == "mass_mute":
+            await bot.restrict_chat_member(chat_id, uid, permissions=MUTED_PERMISSIONS, until_date=until_dt)
+        elif trigger == "mass_ban":
+            await bot.ban_chat_member(chat_id, uid, until_date=until_dt)
+        else:
+            await bot.ban_chat_member(chat_id, uid)
+            await bot.unban_chat_member(chat_id, uid, only_if_banned=True)
+
+    # темп запросов задаёт rate_limiter сессии, семафор ограничивает число одновременных
+    sem = asyncio.Semaphore(cfg.MASS_ACTION_CONCURRENCY)
+
+    async def run(uid: int):
+        async with sem:
+            try:
+                await act(uid)
+                done["ok"] += 1
+            except Exception:
+                done["failed"] += 1
+                failed.append(uid)
+
+    work = asyncio.gather(*(run(uid) for uid in targets))
+    shown = None
+    while True:
+        try:
+            await asyncio.wait_for(asyncio.shield(work), PROGRESS_EDIT_INTERVAL)
+            break
+        except asyncio.TimeoutError:
+            text = progress_text(False)
+            if text != shown:
+                shown = text
+                try:
+                    await bot.edit_message_text(text, chat_id=chat_id, message_id=progress.message_id, parse_mode="HTML")
+                except Exception:
+                    pass
+    # наказание не применилось — запись не должна висеть в списках активных
+    failed_ids = [row_ids[uid] for uid in failed if uid in row_ids]
+    if failed_ids:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(model).where(model.id.in_(failed_ids)).values(active=False)
+                .execution_options(synchronize_session=False))
+            await session.commit()
+    try:
+        await bot.edit_message_text(progress_text(True), chat_id=chat_id, message_id=progress.message_id, parse_mode="HTML")
+    except Exception:
+        pass
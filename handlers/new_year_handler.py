@@ -1,12 +1,13 @@
 from aiogram import Router, types
 from datetime import datetime, timedelta
 import pytz
+from commands import Trigger
 
 router = Router()
 
 COMMANDS = ["нг", "до нг", "до нового года"]
 
-@router.message()
+@router.message(Trigger("new_year"))
 async def new_year_countdown(message: types.Message):
     text = message.text.strip().lower()
     if text not in COMMANDS:
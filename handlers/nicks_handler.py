@@ -1,35 +1,35 @@
-import re
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message
-from db import AsyncSessionLocal
+from db import AsyncSessionLocal, upsert_insert
 from models import Nick
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from config import cfg
+from commands import Trigger
+from services.names_service import names
+from services.usernames_service import usernames
+from services.staff_service import staff_lists
 
 router = Router()
 
 
-@router.message(lambda message: message.text and re.match(r"^-ник\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("del_nick"))
 async def cmd_del_nick(message: Message):
     chat_id = message.chat.id
     user_id = message.from_user.id
 
     async with AsyncSessionLocal() as session:
-        q = await session.execute(select(Nick).where(Nick.chat_id == chat_id, Nick.user_id == user_id))
-        existing = q.scalars().first()
+        result = await session.execute(delete(Nick).where(Nick.chat_id == chat_id, Nick.user_id == user_id))
+        await session.commit()
 
-        if existing:
-            await session.delete(existing)
-            await session.commit()
-            await message.reply("🗑 Ваш ник был удален.", parse_mode="HTML")
-        else:
-            await message.reply("У вас и так нет установленного ника.", parse_mode="HTML")
+    if result.rowcount:
+        names.invalidate(chat_id, user_id)
+        staff_lists.invalidate(chat_id)
+        await message.reply("🗑 Ваш ник был удален.", parse_mode="HTML")
+    else:
+        await message.reply("У вас и так нет установленного ника.", parse_mode="HTML")
 
 
-@router.message(lambda message: message.text and (
-        re.match(r"^\+ник\b", message.text.strip(), re.IGNORECASE) or
-        re.match(r"^ник\s+\S+", message.text.strip(), re.IGNORECASE)
-))
+@router.message(Trigger("set_nick"))
 async def cmd_set_nick(message: Message):
     parts = message.text.strip().split(maxsplit=1)
 
@@ -46,23 +46,19 @@ async def cmd_set_nick(message: Message):
     chat_id = message.chat.id
     user_id = message.from_user.id
 
+    stmt = upsert_insert(Nick).values(chat_id=chat_id, user_id=user_id, nick=new_nick)
+    stmt = stmt.on_conflict_do_update(index_elements=[Nick.chat_id, Nick.user_id], set_={"nick": new_nick})
     async with AsyncSessionLocal() as session:
-        q = await session.execute(select(Nick).where(Nick.chat_id == chat_id, Nick.user_id == user_id))
-        existing = q.scalars().first()
-
-        if existing:
-            existing.nick = new_nick
-            session.add(existing)
-        else:
-            n = Nick(chat_id=chat_id, user_id=user_id, nick=new_nick)
-            session.add(n)
+        await session.execute(stmt)
         await session.commit()
+    names.invalidate(chat_id, user_id)
+    staff_lists.invalidate(chat_id)
 
     user_link = f'<a href="tg://user?id={user_id}">{new_nick}</a>'
     await message.reply(f"✅ Имя изменено на {user_link}!", parse_mode="HTML")
 
 
-@router.message(lambda message: message.text and re.match(r"^(\?ник|ник)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("get_nick"))
 async def cmd_get_nick(message: Message):
     parts = message.text.strip().split()
     chat_id = message.chat.id
@@ -82,25 +78,19 @@ async def cmd_get_nick(message: Message):
                     target_user_id = entity.user.id
                     target_name_fallback = entity.user.full_name
                     break
-                elif entity.type == "mention" and arg.startswith("@"):
-
-                    try:
-
-                        username = arg.lstrip("@")
-                        pass
-                    except Exception:
-                        pass
 
         # Если ID не найден через entities, пробуем числовой ID
         if not target_user_id and arg.isdigit():
             target_user_id = int(arg)
 
-        # Если всё еще нет ID и это похоже на @username, попробуем найти в чате (может вызвать ошибку, если юзера нет)
+        # @username ищем в индексе имён, которые бот видел в сообщениях
         if not target_user_id and arg.startswith("@"):
-            await message.reply(
-                "Для просмотра ника по @username, боту сложно определить ID. Пожалуйста, <b>ответьте</b> на сообщение пользователя командой <code>?ник</code>.",
-                parse_mode="HTML")
-            return
+            target_user_id = await usernames.resolve(arg)
+            if not target_user_id:
+                await message.reply(
+                    f"Пользователь {arg} не найден: бот ещё не видел его сообщений. Пожалуйста, <b>ответьте</b> на сообщение пользователя командой <code>?ник</code>.",
+                    parse_mode="HTML")
+                return
 
 
     else:
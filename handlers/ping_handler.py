@@ -1,7 +1,13 @@
 from datetime import datetime
 from aiogram import Router
-from aiogram.types import Message
+from aiogram.types import Message, BufferedInputFile
 from config import cfg
+from commands import Trigger
+from services import metrics_service as metrics
+from services.profiler_service import profiler
+from services.activity_service import activity
+from services.latency_service import latency
+from services.chat_info_service import chat_info
 from db import AsyncSessionLocal
 from models import Chat, Nick, Warn
 from sqlalchemy import select, func
@@ -10,20 +16,18 @@ import time
 router = Router()
 
 async def measure_api_latency(bot):
-    t0 = time.perf_counter()
-    try:
-        await bot.get_me()
-    except Exception:
-        pass
-    t1 = time.perf_counter()
-    return int((t1 - t0) * 1000)
+    # медиана недавних запросов к API; пока замеров нет — один пробный запрос
+    stats = latency.api_stats()
+    if stats is None:
+        return await latency.measure(bot)
+    return stats["p50"]
 
-@router.message(lambda message: message.text and message.text.strip().lower() in ("ping", "пинг"))
+@router.message(Trigger("ping"))
 async def cmd_ping_simple(message: Message):
     ms = await measure_api_latency(message.bot)
     await message.reply(f"<b>🏓Pong!</b>\nВаш Ping: <b>{ms}</b>ms", parse_mode="HTML")
 
-@router.message(lambda message: message.text and message.text.strip().lower().startswith("ping "))
+@router.message(Trigger("ping_variants"))
 async def cmd_ping_variants(message: Message):
     parts = message.text.strip().split(maxsplit=1)
     arg = parts[1].strip().lower() if len(parts) > 1 else ""
@@ -37,24 +41,15 @@ async def cmd_ping_variants(message: Message):
         return
 
     if arg == "chat":
+        info = await chat_info.get(bot, chat.id)
+        chat_obj = info.chat or chat
+        total_members = info.member_count if info.member_count is not None else "N/A"
+        admin_count = len(info.admins) if info.admins is not None else "N/A"
+        active_users = activity.active_users(chat.id)
         try:
-            chat_obj = await bot.get_chat(chat.id)
+            messages_today = await activity.messages_today(chat.id)
         except Exception:
-            chat_obj = chat
-        try:
-            total_members = await bot.get_chat_member_count(chat.id)
-        except Exception:
-            try:
-                total_members = await bot.get_chat_members_count(chat.id)
-            except Exception:
-                total_members = "N/A"
-        try:
-            admins = await bot.get_chat_administrators(chat.id)
-            admin_count = len(admins)
-        except Exception:
-            admin_count = "N/A"
-        active_users = "N/A"
-        messages_today = "N/A"
+            messages_today = "N/A"
         created_at = getattr(chat_obj, "created_at", None)
         created_display = created_at if created_at else "N/A"
         days_since = "N/A"
@@ -85,7 +80,10 @@ async def cmd_ping_variants(message: Message):
             join_date = getattr(member, "joined_date", None) or getattr(member, "until_date", None) or "N/A"
         except Exception:
             join_date = "N/A"
-        message_count = "N/A"
+        try:
+            message_count = await activity.message_count(chat.id, user.id)
+        except Exception:
+            message_count = "N/A"
         violations_count = 0
         try:
             async with AsyncSessionLocal() as session:
@@ -134,18 +132,20 @@ async def cmd_ping_variants(message: Message):
         if user_id not in cfg.CREATOR_IDS:
             await message.reply("Доступ запрещён.", parse_mode=cfg.PARSE_MODE)
             return
-        uptime = "N/A"
+        uptime = str(int(time.time() - metrics.started_at.get())) + "s"
         try:
             import psutil
-            uptime_sec = time.time() - psutil.boot_time()
-            uptime = str(int(uptime_sec)) + "s"
             cpu = psutil.cpu_percent(interval=0.1)
             mem = int(psutil.virtual_memory().percent)
         except Exception:
             cpu = "N/A"
             mem = "N/A"
-        queue_size = "N/A"
-        last_error_time = "N/A"
+        queue_size = metrics.api_queue_depth.get()
+        last_error_ts = metrics.last_error_time()
+        last_error_time = datetime.fromtimestamp(last_error_ts).strftime("%d.%m.%Y %H:%M:%S") if last_error_ts else "нет"
+        updates_count = int(metrics.updates_total.total())
+        handler_avg = metrics.handler_seconds.overall_mean() or 0
+        db_per_update = metrics.update_db_queries.overall_mean() or 0
         bot_version = "1.0"
         await message.reply(
             "📊 Системная информация:\n"
@@ -153,35 +153,86 @@ async def cmd_ping_variants(message: Message):
             f"├─ Загрузка CPU: {cpu}%\n"
             f"├─ Память: {mem}%\n"
             f"├─ Сообщений в очереди: {queue_size}\n"
+            f"├─ Обработано обновлений: {updates_count}\n"
+            f"├─ Среднее время хендлера: {int(handler_avg * 1000)}ms\n"
+            f"├─ Запросов к БД на обновление: {db_per_update:.1f}\n"
             f"├─ Последняя ошибка: {last_error_time}\n"
             f"└─ Версия: {bot_version}"
             , parse_mode=cfg.PARSE_MODE)
         return
 
+    if arg == "profile" or arg.startswith("profile "):
+        if message.from_user.id not in cfg.CREATOR_IDS:
+            await message.reply("Доступ запрещён.", parse_mode=cfg.PARSE_MODE)
+            return
+        value = arg[len("profile"):].strip()
+        if value == "stop":
+            if not profiler.active:
+                await message.reply("Профилирование не запущено.", parse_mode=cfg.PARSE_MODE)
+                return
+            profiler.finish()
+            return
+        if profiler.active:
+            await message.reply("Профилирование уже идёт. Остановить: ping profile stop", parse_mode=cfg.PARSE_MODE)
+            return
+        updates, seconds = None, None
+        if not value:
+            updates = 100
+        elif value.isdigit():
+            updates = int(value)
+        elif value.endswith(("s", "с")) and value[:-1].isdigit():
+            seconds = float(value[:-1])
+        else:
+            await message.reply(
+                "Использование: ping profile [N | Ns | stop]\n"
+                "N — следующие N обновлений, Ns — следующие N секунд",
+                parse_mode=cfg.PARSE_MODE,
+            )
+            return
+
+        async def send_report(report: str):
+            await bot.send_document(
+                chat.id,
+                BufferedInputFile(report.encode("utf-8"), filename="profile.txt"),
+                caption="📈 Профиль хендлеров",
+                reply_to_message_id=message.message_id,
+            )
+
+        profiler.start(send_report, max_updates=updates, seconds=seconds)
+        limit = f"{updates} обновлений" if updates else f"{int(seconds)} с"
+        await message.reply(
+            f"📈 Профилирование запущено: {limit} (не дольше {int(profiler.max_seconds)} с).",
+            parse_mode=cfg.PARSE_MODE,
+        )
+        return
+
     if arg.startswith("full") or message.text.strip().lower().startswith("/ping full") or message.text.strip().lower().startswith("!пинг полный"):
-        tg_ping = await measure_api_latency(bot)
-        server_ping = 0
-        try:
-            t0 = time.perf_counter()
-            t1 = time.perf_counter()
-            server_ping = int((t1 - t0) * 1000)
-        except Exception:
-            server_ping = 0
-        api_response = tg_ping
-        status = "✅ Стабильный"
+        stats = latency.api_stats()
+        if stats is None:
+            await latency.measure(bot)
+            stats = latency.api_stats()
+        lag = latency.loop_lag()
+        status, advice = latency.verdict(stats)
+        tg_ping = f"{stats['p50']}ms" if stats else "N/A"
+        api_response = f"p50 {stats['p50']} / p95 {stats['p95']} / p99 {stats['p99']}ms, джиттер {stats['jitter']}ms" if stats else "N/A"
+        # задержка внутри бота: насколько event loop опаздывает с пробуждением
+        server_ping = f"{lag['p50']}ms (макс. {lag['max']}ms)" if lag else "N/A"
         await message.reply(
             "🌐 Полная диагностика:\n"
-            f"├─ Ваш пинг до Telegram: {tg_ping}ms\n"
-            f"├─ Пинг до сервера бота: {server_ping}ms\n"
-            f"├─ Скорость ответа API: {api_response}ms\n"
+            f"├─ Ваш пинг до Telegram: {tg_ping}\n"
+            f"├─ Пинг до сервера бота: {server_ping}\n"
+            f"├─ Скорость ответа API: {api_response}\n"
             f"├─ Статус сервера: {status}\n"
-            f"└─ Рекомендация: Все отлично!"
+            f"└─ Рекомендация: {advice}"
             , parse_mode=cfg.PARSE_MODE)
         return
 
     if " vs " in message.text.lower() or message.text.strip().lower().startswith("/ping vs") or message.text.strip().lower().startswith("!пинг против"):
-        user_ping = await measure_api_latency(bot)
-        target_ping = await measure_api_latency(bot)
+        # два последних замера вместо двух лишних запросов к API
+        recent = latency.recent(2)
+        if len(recent) < 2:
+            recent = [await measure_api_latency(bot), await measure_api_latency(bot)]
+        user_ping, target_ping = recent
         await message.reply(f"📊 Забег пингов! {message.from_user.full_name}: {user_ping}ms 🆚 @user: {target_ping}ms", parse_mode=cfg.PARSE_MODE)
         return
 
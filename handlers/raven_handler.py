@@ -4,10 +4,12 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
 from config import cfg
+from commands import Trigger
+from services.broadcast_service import broadcasts
 
 router = Router()
 
-@router.message(Command(commands=["send_raven_bot"]))
+@router.message(Trigger("send_raven_bot"), Command(commands=["send_raven_bot"]))
 async def cmd_send_raven_bot(message: Message):
 
     caller_id = message.from_user.id
@@ -19,13 +21,24 @@ async def cmd_send_raven_bot(message: Message):
     if len(parts) < 3:
         await message.reply(
             "Использование: /send_raven_bot [ссылка] [текст]\n"
-            "Пример: /send_raven_bot https://t.me/c/0000000000/0 Привет всем",
+            "Пример: /send_raven_bot https://t.me/c/0000000000/0 Привет всем\n"
+            "Во все чаты: /send_raven_bot all [текст]",
             parse_mode=cfg.PARSE_MODE,
         )
         return
 
     link = parts[1].strip()
     text = parts[2].strip()
+    if link.lower() in ("all", "всем"):
+        if not text:
+            await message.reply("Текст сообщения не может быть пустым.", parse_mode=cfg.PARSE_MODE)
+            return
+        broadcast_id = await broadcasts.create(message.bot, text, caller_id, message.chat.id)
+        await message.reply(
+            f"📨 Рассылка #{broadcast_id} запущена. Отчёт придёт сюда после завершения.",
+            parse_mode=cfg.PARSE_MODE,
+        )
+        return
     if not link:
         await message.reply("Без указания ссылки нельзя отправлять сообщения!", parse_mode=cfg.PARSE_MODE)
         return
@@ -1,9 +1,13 @@
-import re
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message
-from sqlalchemy import select
-from db import AsyncSessionLocal
-from models import RoleAssignment, Nick
+from sqlalchemy import delete
+from db import AsyncSessionLocal, upsert_insert
+from models import RoleAssignment
+from commands import Trigger
+from services.roles_service import role_cache
+from services.usernames_service import usernames
+from services.names_service import format_user_link, format_user_links
+from services.staff_service import staff_lists
 
 router = Router()
 
@@ -24,39 +28,15 @@ ROLE_NAMES = {
 }
 
 
-async def format_user_link(chat_id: int, user_id: int, bot, session):
-    try:
-        q = await session.execute(select(Nick).where(Nick.chat_id == chat_id, Nick.user_id == user_id))
-        nick = q.scalars().first()
-        if nick:
-            display = nick.nick
-        else:
-            member = await bot.get_chat_member(chat_id, user_id)
-            display = member.user.full_name
-        return f'<a href="tg://user?id={user_id}">{display}</a>'
-    except Exception:
-        return f'<a href="tg://user?id={user_id}">{user_id}</a>'
+async def render_staff_list(chat_id: int, bot) -> str:
+    roles = await role_cache.get_chat_roles(chat_id)
+    grouped_roles = {5: [], 4: [], 3: [], 2: [], 1: []}
+    staff = [user_id for user_id, role_id in roles.items() if role_id in grouped_roles]
+    # все имена одним пакетом: ники одним запросом, остальное из API параллельно
+    links = await format_user_links(chat_id, staff, bot)
 
-
-@router.message(
-    F.text.lower().in_({"?админ", "админы", "?админы", "admins", "/staff", "/admins", "список администрации"}))
-async def cmd_staff_list(message: Message):
-    chat_id = message.chat.id
-
-    async with AsyncSessionLocal() as session:
-        q = await session.execute(
-            select(RoleAssignment)
-            .where(RoleAssignment.chat_id == chat_id)
-            .order_by(RoleAssignment.role_id.desc())
-        )
-        all_staff = q.scalars().all()
-
-        grouped_roles = {5: [], 4: [], 3: [], 2: [], 1: []}
-
-        for staff_member in all_staff:
-            if staff_member.role_id in grouped_roles:
-                link = await format_user_link(chat_id, staff_member.user_id, message.bot, session)
-                grouped_roles[staff_member.role_id].append(link)
+    for user_id in staff:
+        grouped_roles[roles[user_id]].append(links[user_id])
 
     lines = ["<b>🍊 Список администраторов</b>\n"]
     has_staff = False
@@ -72,23 +52,24 @@ async def cmd_staff_list(message: Message):
             lines.append("")
 
     if not has_staff:
-        await message.reply("ℹ️ <b>В этом чате список администрации пуст.</b>", parse_mode="HTML")
-    else:
-        await message.reply("\n".join(lines), parse_mode="HTML")
+        return "ℹ️ <b>В этом чате список администрации пуст.</b>"
+    return "\n".join(lines)
+
+
+@router.message(Trigger("staff_list"))
+async def cmd_staff_list(message: Message):
+    chat_id = message.chat.id
+    text = await staff_lists.get(chat_id, lambda: render_staff_list(chat_id, message.bot))
+    await message.reply(text, parse_mode="HTML")
 
 
-@router.message(F.text.regexp(r"(?i)^(\+|!|/)?(админ|назначить|повысить|setrole|promote)\b"))
+@router.message(Trigger("promote"))
 async def cmd_promote(message: Message):
     parts = message.text.strip().split()
     issuer_id = message.from_user.id
     chat_id = message.chat.id
 
-    async with AsyncSessionLocal() as session:
-        q = await session.execute(
-            select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == issuer_id))
-        issuer_role = q.scalars().first()
-
-    issuer_level = issuer_role.role_id if issuer_role else 0
+    issuer_level = await role_cache.get_role(chat_id, issuer_id) or 0
 
     # Разрешаем только Владельцу (ID 5)
     if issuer_level != 5:
@@ -106,6 +87,8 @@ async def cmd_promote(message: Message):
         if len(parts) >= 3:
             if parts[1].isdigit():
                 target_id = int(parts[1])
+            elif parts[1].startswith("@"):
+                target_id = await usernames.resolve(parts[1])
             role_arg = parts[2].lower()
 
     if not target_id or not role_arg:
@@ -126,41 +109,32 @@ async def cmd_promote(message: Message):
         await message.reply("<b>Вы не можете выдать роль выше или равную своей.</b>", parse_mode="HTML")
         return
 
-    async with AsyncSessionLocal() as session:
-        q_target = await session.execute(
-            select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == target_id))
-        existing_role = q_target.scalars().first()
-
-        target_link = await format_user_link(chat_id, target_id, message.bot, session)
-        role_title = ROLE_MAP[new_role_id]
-
-        if existing_role:
-            existing_role.role_id = new_role_id
-            action_text = "обновлена"
-        else:
-            new_assignment = RoleAssignment(chat_id=chat_id, user_id=target_id, role_id=new_role_id)
-            session.add(new_assignment)
-            action_text = "выдана"
+    # роли чата уже в кэше после проверки выдающего
+    action_text = "обновлена" if await role_cache.get_role(chat_id, target_id) is not None else "выдана"
+    target_link = await format_user_link(chat_id, target_id, message.bot)
+    role_title = ROLE_MAP[new_role_id]
 
+    stmt = upsert_insert(RoleAssignment).values(chat_id=chat_id, user_id=target_id, role_id=new_role_id)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RoleAssignment.chat_id, RoleAssignment.user_id], set_={"role_id": new_role_id, "synced": False})
+    async with AsyncSessionLocal() as session:
+        await session.execute(stmt)
         await session.commit()
+    role_cache.set_role(chat_id, target_id, new_role_id)
+    staff_lists.invalidate(chat_id)
 
     await message.reply(
         f"Пользователю {target_link} {action_text} роль: <b>{role_title}</b> <code>[{new_role_id}]</code>",
         parse_mode="HTML")
 
 
-@router.message(F.text.regexp(r"(?i)^(\+|!|/)?(снять|разжаловать|demote|unrole)\b"))
+@router.message(Trigger("demote"))
 async def cmd_demote(message: Message):
     parts = message.text.strip().split()
     issuer_id = message.from_user.id
     chat_id = message.chat.id
 
-    async with AsyncSessionLocal() as session:
-        q = await session.execute(
-            select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == issuer_id))
-        issuer_role = q.scalars().first()
-
-    issuer_level = issuer_role.role_id if issuer_role else 0
+    issuer_level = await role_cache.get_role(chat_id, issuer_id) or 0
 
     # Разрешаем только Владельцу (ID 5) снимать роли
     if issuer_level != 5:
@@ -172,23 +146,23 @@ async def cmd_demote(message: Message):
         target_id = message.reply_to_message.from_user.id
     elif len(parts) > 1 and parts[1].isdigit():
         target_id = int(parts[1])
+    elif len(parts) > 1 and parts[1].startswith("@"):
+        target_id = await usernames.resolve(parts[1])
 
     if not target_id:
         await message.reply("<b>Укажите пользователя.</b>", parse_mode="HTML")
         return
 
     async with AsyncSessionLocal() as session:
-        q_target = await session.execute(
-            select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == target_id))
-        existing_role = q_target.scalars().first()
-
-        target_link = await format_user_link(chat_id, target_id, message.bot, session)
-
-        if not existing_role:
-            await message.reply(f"У {target_link} нет роли.", parse_mode="HTML")
-            return
-
-        await session.delete(existing_role)
+        result = await session.execute(
+            delete(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == target_id))
         await session.commit()
+    target_link = await format_user_link(chat_id, target_id, message.bot)
+
+    if not result.rowcount:
+        await message.reply(f"У {target_link} нет роли.", parse_mode="HTML")
+        return
+    role_cache.remove_role(chat_id, target_id)
+    staff_lists.invalidate(chat_id)
 
     await message.reply(f"🗑 Роль у пользователя {target_link} была снята.", parse_mode="HTML")
\ No newline at end of file
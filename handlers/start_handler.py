@@ -1,15 +1,14 @@
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
-from db import AsyncSessionLocal
-from models import Chat
-from sqlalchemy import select
 from config import cfg
+from commands import Trigger
+from services.chats_service import known_chats
 
 router = Router()
 
 
-@router.message(Command(commands=["start"]))
+@router.message(Trigger("start"), Command(commands=["start"]))
 async def cmd_start(message: Message):
     nickname = message.from_user.full_name
     text = (
@@ -17,11 +16,5 @@ async def cmd_start(message: Message):
     )
     await message.answer(text, parse_mode=cfg.PARSE_MODE)
 
-    async with AsyncSessionLocal() as session:
-        if message.chat:
-            q = await session.execute(select(Chat).where(Chat.id == message.chat.id))
-            chat = q.scalars().first()
-            if not chat:
-                chat = Chat(id=message.chat.id)
-                session.add(chat)
-                await session.commit()
\ No newline at end of file
+    if message.chat:
+        known_chats.register(message.chat.id)
\ No newline at end of file
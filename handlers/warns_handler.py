@@ -1,34 +1,24 @@
-import re
 from datetime import datetime
 from aiogram import Router
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy import select, update, desc
 from db import AsyncSessionLocal
-from models import Warn, RoleAssignment, Nick
+from models import Warn
 from utils import parse_duration, format_timedelta_remaining
 from keyboards import page_kb
+from pagination import fetch_page, parse_page_callback
 from config import cfg
+from commands import Trigger
+from services.admin_sync_service import admin_sync
+from services.usernames_service import usernames
+from services.names_service import format_user_link, format_user_links
+from services.expiry_service import expiry
 
 router = Router()
 
 
-async def format_user_link(chat_id: int, user_id: int, bot, session):
-    q = await session.execute(select(Nick).where(Nick.chat_id == chat_id, Nick.user_id == user_id))
-    nick = q.scalars().first()
-    if nick:
-        display = nick.nick
-    else:
-        try:
-            member = await bot.get_chat_member(chat_id, user_id)
-            display = member.user.full_name
-        except Exception:
-            display = str(user_id)
-    return f'<a href="tg://user?id={user_id}">{display}</a>'
-
-
 # --- ХЕНДЛЕР ВЫДАЧИ ПРЕДУПРЕЖДЕНИЯ ---
-@router.message(
-    lambda message: message.text and re.match(r"^(?:\+?пред|\+?варн|\+пред|\+варн)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("warn"))
 async def cmd_warn(message: Message):
     parts = message.text.strip().split(maxsplit=2)
 
@@ -60,11 +50,8 @@ async def cmd_warn(message: Message):
     chat_id = message.chat.id
 
 
-    async with AsyncSessionLocal() as session:
-        q = await session.execute(
-            select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == issuer))
-        caller_assign = q.scalars().first()
-    if not caller_assign or caller_assign.role_id < 1:
+    caller_role = await admin_sync.role_of(message.bot, chat_id, issuer)
+    if not caller_role or caller_role < 1:
         await message.reply("<b>❌ Вы не имеете права выдавать предупреждения.</b>", parse_mode="HTML")
         return
 
@@ -74,11 +61,13 @@ async def cmd_warn(message: Message):
     else:
         token = parts[1]
         if token.startswith("@"):
-            await message.reply(
-                "<b>Пожалуйста, используйте reply на сообщение пользователя или укажите его id (без @username).</b>",
-                parse_mode="HTML")
-            return
-        if token.isdigit():
+            target_id = await usernames.resolve(token)
+            if target_id is None:
+                await message.reply(
+                    f"<b>Пользователь {token} не найден: бот ещё не видел его сообщений. Ответьте на сообщение пользователя или укажите его id.</b>",
+                    parse_mode="HTML")
+                return
+        elif token.isdigit():
             target_id = int(token)
         else:
             await message.reply("<b>Не удалось определить пользователя. Укажите ID или ответьте на сообщение.</b>",
@@ -131,7 +120,8 @@ async def cmd_warn(message: Message):
         session.add(w)
         await session.commit()
         await session.refresh(w)
-        link = await format_user_link(chat_id, target_id, message.bot, session)
+    expiry.schedule(Warn, w.id, until_dt)
+    link = await format_user_link(chat_id, target_id, message.bot)
 
     until_text = until_dt.strftime("%H:%M:%S %d.%m.%Y") if until_dt else "без срока"
     await message.reply(f"⚠️ {link} получил предупреждение до <b>{until_text}</b> за: <b>{reason or 'Причина не указана'}</b>.",
@@ -139,8 +129,7 @@ async def cmd_warn(message: Message):
 
 
 # --- ХЕНДЛЕР СНЯТИЯ ПРЕДУПРЕЖДЕНИЯ ---
-@router.message(
-    lambda message: message.text and re.match(r"^(-варн|-пред|снять)\b", message.text.strip(), re.IGNORECASE))
+@router.message(Trigger("unwarn"))
 async def cmd_unwarn(message: Message):
     parts = message.text.strip().split(maxsplit=1)
     chat_id = message.chat.id
@@ -153,22 +142,22 @@ async def cmd_unwarn(message: Message):
             token = parts[1].split()[0]
             if token.isdigit():
                 target_id = int(token)
+            elif token.startswith("@"):
+                target_id = await usernames.resolve(token)
 
     if not target_id:
-        await message.reply("<b>Ответьте на сообщение пользователя или укажите его id.</b>", parse_mode="HTML")
+        await message.reply("<b>Ответьте на сообщение пользователя или укажите его id или @username.</b>", parse_mode="HTML")
         return
 
     issuer = message.from_user.id
 
-    async with AsyncSessionLocal() as session:
-        # Проверка прав
-        q = await session.execute(
-            select(RoleAssignment).where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == issuer))
-        caller_assign = q.scalars().first()
-        if not caller_assign or caller_assign.role_id < 1:
-            await message.reply("<b>❌ Вы не имеете права снимать предупреждения.</b>", parse_mode="HTML")
-            return
+    # Проверка прав
+    caller_role = await admin_sync.role_of(message.bot, chat_id, issuer)
+    if not caller_role or caller_role < 1:
+        await message.reply("<b>❌ Вы не имеете права снимать предупреждения.</b>", parse_mode="HTML")
+        return
 
+    async with AsyncSessionLocal() as session:
         # Ищем только последнее активное предупреждение (по created_at)
         stmt = select(Warn).where(
             Warn.chat_id == chat_id,
@@ -179,7 +168,7 @@ async def cmd_unwarn(message: Message):
         result = await session.execute(stmt)
         warn_to_remove = result.scalars().first()
 
-        link = await format_user_link(chat_id, target_id, message.bot, session)
+        link = await format_user_link(chat_id, target_id, message.bot)
 
         if warn_to_remove:
             warn_to_remove.active = False
@@ -190,8 +179,42 @@ async def cmd_unwarn(message: Message):
 
 
 # --- ХЕНДЛЕР СПИСКА ПРЕДУПРЕЖДЕНИЙ ---
-@router.message(
-    lambda message: message.text and re.match(r"^(\?пред|\?варн)(\s+(\d+))?$", message.text.strip(), re.IGNORECASE))
+async def fetch_warns_page(chat_id: int, target_user_id, page: int, direction=None, cursor=None):
+    conditions = [Warn.chat_id == chat_id, Warn.active == True]
+    if target_user_id:
+        conditions.append(Warn.user_id == target_user_id)
+    async with AsyncSessionLocal() as session:
+        return await fetch_page(session, Warn, conditions, page, direction, cursor)
+
+
+async def render_warns_page(chat_id: int, target_user_id, result, bot):
+    text_lines = []
+    header = "⚠️ Активные предупреждения"
+    if target_user_id:
+        target_display = await format_user_link(chat_id, target_user_id, bot)
+        header = f"⚠️ Активные предупреждения для {target_display}"
+    text_lines.append(f"<b>{header}</b>")
+    text_lines.append(f"┌─ <b>Всего активных предупреждений:</b> {result.total}")
+    text_lines.append("├─ <b>Список предупреждений:</b>")
+
+    links = await format_user_links(
+        chat_id, [uid for w in result.rows for uid in (w.user_id, w.issued_by) if uid], bot)
+    for idx, w in enumerate(result.rows, start=result.start + 1):
+        rem = format_timedelta_remaining(w.until) if w.until else "без срока"
+        link = links[w.user_id]
+        # Показываем кто выдал предупреждение и причину
+        issuer_link = links[w.issued_by] if w.issued_by else "Система"
+        created = w.created_at.strftime("%d.%m.%Y %H:%M") if getattr(w, "created_at", None) else ""
+        text_lines.append(
+            f"│   {idx}. {link} — <b>за</b>: {w.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}"
+        )
+
+    text_lines.append(f"└─ <b>Страница:</b> {result.page}/{result.total_pages}")
+    kb = page_kb(result.page, prefix="warns", prev_cursor=result.prev_cursor, next_cursor=result.next_cursor)
+    return "\n".join(text_lines), kb
+
+
+@router.message(Trigger("list_warns"))
 async def cmd_list_warns(message: Message):
     chat_id = message.chat.id
     text = message.text.strip()
@@ -200,133 +223,46 @@ async def cmd_list_warns(message: Message):
     # Если указан номер страницы в аргументе — используем его
     if len(parts) >= 2 and parts[1].isdigit():
         page = max(1, int(parts[1]))
-    per_page = 10
 
     # Если команда вызвана как reply — показываем предупреждения конкретного игрока
     target_user_id = None
-    target_display = None
     if message.reply_to_message and message.reply_to_message.from_user:
         target_user_id = message.reply_to_message.from_user.id
 
-    async with AsyncSessionLocal() as session:
-        if target_user_id:
-            q = await session.execute(
-                select(Warn).where(Warn.chat_id == chat_id, Warn.active == True, Warn.user_id == target_user_id)
-                .order_by(Warn.created_at.desc()))
-            warns = q.scalars().all()
-            # получим отображаемое имя для заголовка
-            target_display = await format_user_link(chat_id, target_user_id, message.bot, session)
-        else:
-            q = await session.execute(
-                select(Warn).where(Warn.chat_id == chat_id, Warn.active == True).order_by(Warn.created_at.desc()))
-            warns = q.scalars().all()
-
-    total = len(warns)
-    if total == 0:
+    result = await fetch_warns_page(chat_id, target_user_id, page)
+    if result is None:
         if target_user_id:
+            target_display = await format_user_link(chat_id, target_user_id, message.bot)
             await message.reply(f"ℹ️ {target_display} не имеет активных предупреждений.", parse_mode="HTML")
         else:
             await message.reply("ℹ️ В чате нет активных предупреждений.", parse_mode="HTML")
         return
 
-    total_pages = max(1, (total + per_page - 1) // per_page)
-    if page > total_pages:
-        page = total_pages
-
-    start = (page - 1) * per_page
-    page_warns = warns[start:start + per_page]
-
-    text_lines = []
-    header = "⚠️ Активные предупреждения"
-    if target_user_id:
-        header = f"⚠️ Активные предупреждения для {target_display}"
-    text_lines.append(f"<b>{header}</b>")
-    text_lines.append(f"┌─ <b>Всего активных предупреждений:</b> {total}")
-    text_lines.append("├─ <b>Список предупреждений:</b>")
-
-    async with AsyncSessionLocal() as session:
-        for idx, w in enumerate(page_warns, start=start + 1):
-            rem = format_timedelta_remaining(w.until) if w.until else "без срока"
-            link = await format_user_link(chat_id, w.user_id, message.bot, session)
-            # Показываем кто выдал предупреждение и причину
-            issuer_link = await format_user_link(chat_id, w.issued_by, message.bot, session) if w.issued_by else "Система"
-            created = w.created_at.strftime("%d.%m.%Y %H:%M") if getattr(w, "created_at", None) else ""
-            text_lines.append(
-                f"│   {idx}. {link} — <b>за</b>: {w.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}"
-            )
-
-    text_lines.append(f"└─ <b>Страница:</b> {page}/{total_pages}")
-    kb = page_kb(page, prefix="warns")
-    await message.reply("\n".join(text_lines), reply_markup=kb, parse_mode="HTML")
+    text, kb = await render_warns_page(chat_id, target_user_id, result, message.bot)
+    await message.reply(text, reply_markup=kb, parse_mode="HTML")
 
 
 @router.callback_query(lambda c: c.data and c.data.startswith("warns:"))
 async def cb_warns_page(query: CallbackQuery):
-    parts = query.data.split(":")
-    try:
-        page = int(parts[1])
-    except Exception:
-        page = 1
-    if page < 1:
-        page = 1
-    per_page = 10
+    page, direction, cursor = parse_page_callback(query.data)
     chat_id = query.message.chat.id
 
     # Поддерживаем ту же логику: если сообщение-источник было reply к пользователю,
     # то в навигации остаёмся в контексте этого пользователя.
     target_user_id = None
-    target_display = None
     if query.message.reply_to_message and query.message.reply_to_message.from_user:
         target_user_id = query.message.reply_to_message.from_user.id
 
-    async with AsyncSessionLocal() as session:
-        if target_user_id:
-            q = await session.execute(
-                select(Warn).where(Warn.chat_id == chat_id, Warn.active == True, Warn.user_id == target_user_id)
-                .order_by(Warn.created_at.desc()))
-            warns = q.scalars().all()
-            target_display = await format_user_link(chat_id, target_user_id, query.bot, session)
-        else:
-            q = await session.execute(
-                select(Warn).where(Warn.chat_id == chat_id, Warn.active == True).order_by(Warn.created_at.desc()))
-            warns = q.scalars().all()
-
-    total = len(warns)
-    # Если предупреждений уже нет — НЕ редактируем сообщение и НЕ отправляем текст.
+    result = await fetch_warns_page(chat_id, target_user_id, page, direction, cursor)
+    # Если предупреждений уже нет (или листать дальше некуда) — НЕ редактируем сообщение и НЕ отправляем текст.
     # Просто закрываем callback, чтобы не показывать лишние уведомления пользователю.
-    if total == 0:
+    if result is None:
         await query.answer()  # silently acknowledge the callback
         return
 
-    total_pages = max(1, (total + per_page - 1) // per_page)
-    if page > total_pages:
-        page = total_pages
-
-    start = (page - 1) * per_page
-    page_warns = warns[start:start + per_page]
-
-    text_lines = []
-    header = "⚠️ Активные предупреждения"
-    if target_user_id:
-        header = f"⚠️ Активные предупреждения для {target_display}"
-    text_lines.append(f"<b>{header}</b>")
-    text_lines.append(f"┌─ <b>Всего активных предупреждений:</b> {total}")
-    text_lines.append("├─ <b>Список предупреждений:</b>")
-
-    async with AsyncSessionLocal() as session:
-        for idx, w in enumerate(page_warns, start=start + 1):
-            rem = format_timedelta_remaining(w.until) if w.until else "без срока"
-            link = await format_user_link(chat_id, w.user_id, query.bot, session)
-            issuer_link = await format_user_link(chat_id, w.issued_by, query.bot, session) if w.issued_by else "Система"
-            created = w.created_at.strftime("%d.%m.%Y %H:%M") if getattr(w, "created_at", None) else ""
-            text_lines.append(
-                f"│   {idx}. {link} — <b>за</b>: {w.reason or 'Причина не указана'}; <b>до</b>: ({rem}); <b>выдал</b>: {issuer_link} {created}"
-            )
-
-    text_lines.append(f"└─ <b>Страница:</b> {page}/{total_pages}")
-    kb = page_kb(page, prefix="warns")
+    text, kb = await render_warns_page(chat_id, target_user_id, result, query.bot)
     try:
-        await query.message.edit_text("\n".join(text_lines), reply_markup=kb, parse_mode="HTML")
+        await query.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
     except Exception:
         await query.answer("Не удалось обновить сообщение.", show_alert=False)
         return
@@ -1,13 +1,25 @@
+from typing import Optional
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 
-def page_kb(page: int, prefix: str = "page"):
+def page_kb(page: int, prefix: str = "page", prev_cursor: Optional[str] = None, next_cursor: Optional[str] = None):
     """
     Returns InlineKeyboardMarkup with Prev and Next buttons.
     Constructed explicitly using inline_keyboard field to satisfy pydantic validation.
+    If cursors are given, they are carried in callback data ("prefix:page:p|n:cursor")
+    so the next page is selected by key instead of by offset.
     """
-    prev = InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}:{max(1, page-1)}")
-    nxt = InlineKeyboardButton(text="➡️", callback_data=f"{prefix}:{page+1}")
+    if prev_cursor and page > 1:
+        prev_data = f"{prefix}:{page-1}:p:{prev_cursor}"
+    else:
+        prev_data = f"{prefix}:{max(1, page-1)}"
+    if next_cursor:
+        next_data = f"{prefix}:{page+1}:n:{next_cursor}"
+    else:
+        next_data = f"{prefix}:{page+1}"
+    prev = InlineKeyboardButton(text="⬅️", callback_data=prev_data)
+    nxt = InlineKeyboardButton(text="➡️", callback_data=next_data)
     # Two buttons in one row
     kb = InlineKeyboardMarkup(inline_keyboard=[[prev, nxt]])
-    return kb
\ No newline at end of file
+    return kb
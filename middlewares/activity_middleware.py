@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from services.activity_service import activity
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для сообщений: считает каждое сообщение в группе,
+    включая обычные, поэтому подключается раньше CommandsMiddleware.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = event.from_user
+        if user is not None and not user.is_bot and event.chat.type in ("group", "supergroup"):
+            activity.record(event.chat.id, user.id, datetime.now())
+        return await handler(event, data)
@@ -0,0 +1,26 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Message
+
+from commands import classify
+
+
+class CommandsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для сообщений: один раз классифицирует текст и кладёт
+    ключ команды в data["trigger"]. Обычные сообщения дальше не идут.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        trigger = classify(event.text)
+        if trigger is None:
+            return UNHANDLED
+        data["trigger"] = trigger
+        return await handler(event, data)
@@ -0,0 +1,78 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import TelegramObject, Update
+
+from services import metrics_service as metrics
+from services.latency_service import latency
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для обновлений: пропускная способность, полное время
+    обработки и число/время запросов к БД за обновление.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type
+        stats = [0, 0.0]
+        token = metrics.current_db_stats.set(stats)
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.current_db_stats.reset(token)
+            metrics.updates_total.inc(update_type)
+            metrics.update_seconds.observe(time.perf_counter() - t0, update_type)
+            metrics.update_db_queries.observe(stats[0])
+            metrics.update_db_seconds.observe(stats[1])
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: время выполнения конкретного хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.handler_seconds.observe(time.perf_counter() - t0, name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: задержка и ошибки каждого метода Bot API.
+    Подключается после rate_limiter, поэтому ожидание в очереди не учитывает.
+    Успешные запросы, кроме долгого опроса getUpdates, идут в замеры для ping.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        t0 = time.perf_counter()
+        try:
+            result = await make_request(bot, method)
+            if not isinstance(method, GetUpdates):
+                latency.record(time.perf_counter() - t0)
+            return result
+        except Exception as e:
+            metrics.api_errors_total.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.api_seconds.observe(time.perf_counter() - t0, name)
@@ -0,0 +1,28 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from services.profiler_service import profiler
+
+
+class ProfilerMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: во время сессии профилирования отмечает вызовы
+    хендлеров. В остальное время — одна проверка флага.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not profiler.active:
+            return await handler(event, data)
+        callback = data["handler"].callback
+        started = profiler.handler_started(callback)
+        try:
+            return await handler(event, data)
+        finally:
+            profiler.handler_finished(callback, started)
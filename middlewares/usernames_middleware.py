@@ -0,0 +1,24 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from services.usernames_service import usernames
+
+
+class UsernamesMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для сообщений: запоминает @username авторов всех
+    сообщений (и тех, кому отвечают), чтобы команды могли принять @username.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        for user in (event.from_user, event.reply_to_message and event.reply_to_message.from_user):
+            if user is not None and user.username:
+                usernames.record(user.id, user.username)
+        return await handler(event, data)
@@ -0,0 +1,183 @@
+"""
+Версионные миграции схемы. Применяются при старте из db.init_db() после
+create_all: create_all создаёт недостающие таблицы, а миграции доводят уже
+существующие базы до актуального состояния (индексы, новые колонки).
+Применённые версии записываются в таблицу schema_migrations.
+
+Проверка планов запросов хендлеров:
+    python migrations.py explain
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+PUNISHMENT_TABLES = ("warns", "mutes", "bans")
+
+
+def _dedupe(conn, table: str):
+    # Оставляем самую раннюю запись: именно её возвращал .scalars().first()
+    conn.execute(text(
+        f"DELETE FROM {table} WHERE id NOT IN "
+        f"(SELECT MIN(id) FROM {table} GROUP BY chat_id, user_id)"
+    ))
+
+
+def _m1_hot_query_indexes(conn):
+    for table in ("nicks", "role_assignments"):
+        _dedupe(conn, table)
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_chat_user ON {table} (chat_id, user_id)"
+        ))
+    for table in PUNISHMENT_TABLES:
+        # списки и счётчики активных наказаний чата
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_chat_active_created "
+            f"ON {table} (chat_id, active, created_at DESC, id DESC)"
+        ))
+        # наказания конкретного пользователя, снятие последнего
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_chat_user_active_created "
+            f"ON {table} (chat_id, user_id, active, created_at DESC)"
+        ))
+        # планировщик истечения сроков
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_active_until "
+            f"ON {table} (active, until) WHERE until IS NOT NULL"
+        ))
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _m2_chat_active(conn):
+    # свежие базы получают колонку из create_all
+    if not _has_column(conn, "chats", "active"):
+        conn.execute(text("ALTER TABLE chats ADD COLUMN active BOOLEAN NOT NULL DEFAULT 1"))
+
+
+def _m3_role_synced(conn):
+    if not _has_column(conn, "role_assignments", "synced"):
+        conn.execute(text("ALTER TABLE role_assignments ADD COLUMN synced BOOLEAN NOT NULL DEFAULT 0"))
+
+
+def _m4_usernames_user(conn):
+    # у пользователя остаётся только последнее известное имя
+    conn.execute(text(
+        "DELETE FROM usernames WHERE id NOT IN "
+        "(SELECT MAX(id) FROM usernames GROUP BY user_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_usernames_user ON usernames (user_id)"))
+
+
+MIGRATIONS = (
+    (1, "composite indexes for hot queries, unique (chat_id, user_id) for nicks/roles", _m1_hot_query_indexes),
+    (2, "chats.active flag for broadcasts", _m2_chat_active),
+    (3, "role_assignments.synced marker for admin sync", _m3_role_synced),
+    (4, "usernames: one row per user, index on user_id", _m4_usernames_user),
+)
+
+
+def apply_migrations(conn):
+    """
+    Синхронная функция для conn.run_sync(): применяет все неприменённые миграции
+    по порядку. Вызывается внутри engine.begin(), так что при ошибке
+    откатываются и изменения схемы, и записи о версиях.
+    """
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP)"
+    ))
+    applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %s: %s", version, description)
+        migrate(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+            {"v": version, "d": description, "t": datetime.utcnow()},
+        )
+
+
+def hot_queries():
+    """
+    Запросы в той форме, в какой их выполняют хендлеры и сервисы.
+    """
+    from sqlalchemy import select, func, and_, or_, update
+    from models import Warn, Mute, Ban, Nick, RoleAssignment, Chat, ActivityDaily, Membership, Username
+
+    now = datetime.utcnow()
+    queries = {}
+    for model in (Warn, Mute, Ban):
+        t = model.__tablename__
+        chat_active = [model.chat_id == 1, model.active == True]
+        queries[f"{t}: count active in chat"] = select(func.count()).select_from(model).where(*chat_active)
+        newest_first = (model.created_at.desc().nulls_last(), model.id.desc())
+        queries[f"{t}: first page"] = (
+            select(model).where(*chat_active)
+            .order_by(*newest_first).limit(10))
+        queries[f"{t}: next page by cursor"] = (
+            select(model).where(*chat_active, or_(model.created_at < now, and_(model.created_at == now, model.id < 5)))
+            .order_by(*newest_first).limit(10))
+        queries[f"{t}: next page after rows without created_at"] = (
+            select(model).where(*chat_active, model.created_at.is_(None), model.id < 5)
+            .order_by(model.id.desc()).limit(10))
+        queries[f"{t}: user's active, newest first"] = (
+            select(model).where(*chat_active, model.user_id == 2)
+            .order_by(model.created_at.desc()).limit(1))
+        queries[f"{t}: expiry load"] = select(model.id, model.until, model.chat_id).where(model.active == True, model.until.isnot(None))
+        queries[f"{t}: expiry update"] = (
+            update(model).where(model.id.in_([1, 2, 3]), model.active == True).values(active=False))
+    queries["chats: broadcast chunk"] = (
+        select(Chat.id).where(Chat.active == True, Chat.id > -100).order_by(Chat.id).limit(100))
+    queries["activity_daily: chat today"] = (
+        select(func.sum(ActivityDaily.messages)).where(ActivityDaily.chat_id == 1, ActivityDaily.day == now.date()))
+    queries["activity_daily: user total"] = (
+        select(func.sum(ActivityDaily.messages)).where(ActivityDaily.chat_id == 1, ActivityDaily.user_id == 2))
+    queries["warns: user's warns"] = select(Warn).where(Warn.chat_id == 1, Warn.user_id == 2)
+    queries["nicks: batch lookup"] = select(Nick.user_id, Nick.nick).where(Nick.chat_id == 1, Nick.user_id.in_([1, 2]))
+    queries["role_assignments: chat map"] = (
+        select(RoleAssignment.user_id, RoleAssignment.role_id)
+        .where(RoleAssignment.chat_id == 1).order_by(RoleAssignment.id))
+    queries["role_assignments: admin sync diff"] = (
+        select(RoleAssignment.user_id, RoleAssignment.role_id, RoleAssignment.synced)
+        .where(RoleAssignment.chat_id == 1))
+    queries["chat_members: status"] = (
+        select(Membership.status).where(Membership.chat_id == 1, Membership.user_id == 2))
+    queries["chat_members: joined since"] = (
+        select(Membership.user_id, Membership.status).where(Membership.chat_id == 1, Membership.joined_at >= now))
+    queries["usernames: resolve"] = select(Username.user_id).where(Username.username == "name")
+    return queries
+
+
+async def explain():
+    from db import engine, init_db
+
+    queries = hot_queries()
+    await init_db()
+    full_scans = 0
+    async with engine.connect() as conn:
+        for name, stmt in queries.items():
+            sql = str(stmt.compile(engine.sync_engine, compile_kwargs={"literal_binds": True}))
+            rows = (await conn.execute(text("EXPLAIN QUERY PLAN " + sql))).all()
+            plan = [row[-1] for row in rows]
+            scans = [p for p in plan if p.startswith("SCAN") and "USING" not in p]
+            full_scans += len(scans)
+            print(f"{'FULL SCAN' if scans else 'ok':9} {name}")
+            for p in plan:
+                print(f"          {p}")
+    print(f"\nFull scans: {full_scans}")
+    return full_scans
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    if sys.argv[1:] == ["explain"]:
+        sys.exit(1 if asyncio.run(explain()) else 0)
+    print("Usage: python migrations.py explain")
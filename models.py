@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, Date, DateTime, Index
 from datetime import datetime
 from db import Base
 
@@ -15,6 +15,8 @@ class Chat(Base):
     __tablename__ = "chats"
     __table_args__ = {"extend_existing": True}
     id = Column(BigInteger, primary_key=True)
+    # False, если бота удалили из чата или он не может туда писать
+    active = Column(Boolean, default=True, nullable=False, server_default="1")
 
 class RoleAssignment(Base):
     __tablename__ = "role_assignments"
@@ -26,6 +28,8 @@ class RoleAssignment(Base):
     assigned_by = Column(BigInteger, nullable=True)
     assigned_at = Column(DateTime, default=datetime.utcnow)
     reason = Column(Text, nullable=True)
+    # True, если роль выдана синхронизацией с администраторами чата в Telegram
+    synced = Column(Boolean, default=False, nullable=False, server_default="0")
 
 class Nick(Base):
     __tablename__ = "nicks"
@@ -69,4 +73,69 @@ class Ban(Base):
     reason = Column(Text, nullable=True)
     until = Column(DateTime, nullable=True)
     active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+    __table_args__ = {"extend_existing": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    text = Column(Text, nullable=False)
+    created_by = Column(BigInteger, nullable=True)
+    report_chat_id = Column(BigInteger, nullable=True)
+    # id последнего обработанного чата: рассылка идёт по возрастанию Chat.id
+    last_chat_id = Column(BigInteger, nullable=True)
+    sent = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class ActivityDaily(Base):
+    __tablename__ = "activity_daily"
+    __table_args__ = {"extend_existing": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    day = Column(Date, nullable=False)
+    messages = Column(Integer, default=0, nullable=False)
+    last_seen = Column(DateTime, nullable=True)
+
+
+# Последний известный статус пользователя в чате: из обновлений chat_member
+# или ответа get_chat_member. joined_at — время последнего входа, UTC
+class Membership(Base):
+    __tablename__ = "chat_members"
+    __table_args__ = {"extend_existing": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    status = Column(String(16), nullable=False)
+    joined_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Последний известный владелец @username; username хранится в нижнем регистре
+class Username(Base):
+    __tablename__ = "usernames"
+    __table_args__ = {"extend_existing": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    username = Column(String(32), nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Индексы под частые запросы; те же индексы создаёт миграция 1 в migrations.py
+Index("uq_nicks_chat_user", Nick.chat_id, Nick.user_id, unique=True)
+Index("uq_role_assignments_chat_user", RoleAssignment.chat_id, RoleAssignment.user_id, unique=True)
+Index("uq_activity_daily_chat_user_day", ActivityDaily.chat_id, ActivityDaily.user_id, ActivityDaily.day, unique=True)
+Index("ix_activity_daily_chat_day", ActivityDaily.chat_id, ActivityDaily.day)
+Index("uq_chat_members_chat_user", Membership.chat_id, Membership.user_id, unique=True)
+Index("ix_chat_members_chat_joined", Membership.chat_id, Membership.joined_at)
+Index("uq_usernames_username", Username.username, unique=True)
+Index("ix_usernames_user", Username.user_id)
+for _model in (Warn, Mute, Ban):
+    _table = _model.__tablename__
+    Index(f"ix_{_table}_chat_active_created", _model.chat_id, _model.active, _model.created_at.desc(), _model.id.desc())
+    Index(f"ix_{_table}_chat_user_active_created", _model.chat_id, _model.user_id, _model.active, _model.created_at.desc())
+    Index(f"ix_{_table}_active_until", _model.active, _model.until,
+          sqlite_where=_model.until.isnot(None), postgresql_where=_model.until.isnot(None))
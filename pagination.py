@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+
+PER_PAGE = 10
+
+# created_at в курсоре хранится в компактном виде, чтобы callback_data уложилась в 64 байта
+_CURSOR_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+@dataclass
+class Page:
+    rows: List[Any]
+    page: int
+    total: int
+    total_pages: int
+    per_page: int = PER_PAGE
+
+    @property
+    def start(self) -> int:
+        return (self.page - 1) * self.per_page
+
+    @property
+    def prev_cursor(self) -> str:
+        return encode_cursor(self.rows[0])
+
+    @property
+    def next_cursor(self) -> str:
+        return encode_cursor(self.rows[-1])
+
+
+def encode_cursor(row) -> str:
+    # у старых записей created_at может быть NULL — тогда в курсоре пустая строка
+    created_at = row.created_at.strftime(_CURSOR_FORMAT) if row.created_at is not None else ""
+    return f"{created_at}:{row.id}"
+
+
+def parse_page_callback(data: str) -> Tuple[int, Optional[str], Optional[Tuple[Optional[datetime], int]]]:
+    """
+    Разбирает callback_data вида "prefix:page" (старые кнопки) или
+    "prefix:page:n|p:created_at:id" (кнопки с курсором, created_at может быть пустым).
+    Возвращает (page, direction, cursor).
+    """
+    parts = data.split(":")
+    try:
+        page = max(1, int(parts[1]))
+    except Exception:
+        page = 1
+    if len(parts) == 5 and parts[2] in ("n", "p"):
+        try:
+            created_at = datetime.strptime(parts[3], _CURSOR_FORMAT) if parts[3] else None
+            cursor = (created_at, int(parts[4]))
+            return page, parts[2], cursor
+        except ValueError:
+            pass
+    return page, None, None
+
+
+async def fetch_page(session, model, conditions, page: int = 1, direction: Optional[str] = None,
+                     cursor: Optional[Tuple[Optional[datetime], int]] = None,
+                     per_page: int = PER_PAGE) -> Optional[Page]:
+    """
+    Одна страница строк model, отсортированных по (created_at, id) от новых к старым;
+    строки без created_at идут после всех остальных, между собой — по id.
+    С курсором страница выбирается по ключу: "n" — строки старше курсора,
+    "p" — новее. Без курсора используется номер страницы (OFFSET).
+    Возвращает None, если строк нет или в выбранном направлении больше ничего нет.
+    """
+    q = await session.execute(select(func.count()).select_from(model).where(*conditions))
+    total = q.scalar() or 0
+    if total == 0:
+        return None
+    total_pages = max(1, (total + per_page - 1) // per_page)
+    page = min(max(1, page), total_pages)
+
+    base = select(model).where(*conditions)
+    dated, undated = model.created_at.is_not(None), model.created_at.is_(None)
+    newest_first = (model.created_at.desc().nulls_last(), model.id.desc())
+    oldest_first = (model.created_at.asc().nulls_first(), model.id.asc())
+    # строки без created_at — отдельным запросом: OR с IS NULL лишает запрос диапазона по индексу
+    if cursor is not None and direction == "n":
+        created_at, row_id = cursor
+        if created_at is None:
+            parts = [base.where(undated, model.id < row_id).order_by(model.id.desc())]
+        else:
+            parts = [base.where(or_(model.created_at < created_at,
+                                    and_(model.created_at == created_at, model.id < row_id)))
+                     .order_by(*newest_first),
+                     base.where(undated).order_by(model.id.desc())]
+    elif cursor is not None and direction == "p":
+        created_at, row_id = cursor
+        if created_at is None:
+            parts = [base.where(undated, model.id > row_id).order_by(model.id.asc()),
+                     base.where(dated).order_by(*oldest_first)]
+        else:
+            parts = [base.where(or_(model.created_at > created_at,
+                                    and_(model.created_at == created_at, model.id > row_id)))
+                     .order_by(*oldest_first)]
+    else:
+        parts = [base.order_by(*newest_first).offset((page - 1) * per_page)]
+
+    rows = []
+    for stmt in parts:
+        q = await session.execute(stmt.limit(per_page - len(rows)))
+        rows.extend(q.scalars().all())
+        if len(rows) >= per_page:
+            break
+    if not rows:
+        return None
+    if direction == "p" and cursor is not None:
+        rows.reverse()
+    return Page(rows=rows, page=page, total=total, total_pages=total_pages, per_page=per_page)
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, func
+
+from config import cfg
+from db import AsyncSessionLocal, upsert_insert
+from models import ActivityDaily
+
+logger = logging.getLogger(__name__)
+
+WINDOW_HOURS = 24
+
+
+def _hour(when: datetime) -> int:
+    return int(when.timestamp()) // 3600
+
+
+class ActiveWindow:
+    """
+    Скользящее окно "активных за 24 часа" для одного чата.
+    Для каждого пользователя хранится час последнего сообщения, а в кольце
+    из 24 ячеек — сколько пользователей последний раз писали в этот час.
+    Ответ — сумма актуальных ячеек, без перебора пользователей.
+    """
+
+    __slots__ = ("last_hour", "counts", "stamps")
+
+    def __init__(self):
+        self.last_hour: Dict[int, int] = {}
+        self.counts = [0] * WINDOW_HOURS
+        self.stamps = [-1] * WINDOW_HOURS
+
+    def _slot(self, hour: int) -> int:
+        i = hour % WINDOW_HOURS
+        if self.stamps[i] != hour:
+            self.stamps[i] = hour
+            self.counts[i] = 0
+        return i
+
+    def touch(self, user_id: int, hour: int):
+        prev = self.last_hour.get(user_id)
+        if prev is not None and prev >= hour:
+            return
+        if prev is not None and self.stamps[prev % WINDOW_HOURS] == prev:
+            self.counts[prev % WINDOW_HOURS] -= 1
+        self.counts[self._slot(hour)] += 1
+        self.last_hour[user_id] = hour
+
+    def active(self, now_hour: int) -> int:
+        oldest = now_hour - WINDOW_HOURS + 1
+        return sum(c for c, h in zip(self.counts, self.stamps) if oldest <= h <= now_hour)
+
+    def prune(self, now_hour: int):
+        oldest = now_hour - WINDOW_HOURS + 1
+        stale = [uid for uid, h in self.last_hour.items() if h < oldest]
+        for uid in stale:
+            del self.last_hour[uid]
+
+
+class ActivityTracker:
+    """
+    Счётчики сообщений по (чат, пользователь, день). Middleware только
+    увеличивает счётчик в памяти; раз в flush_interval секунд накопленное
+    пишется в activity_daily пачками upsert'ов.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[Tuple[int, int, date], List] = {}
+        self._windows: Dict[int, ActiveWindow] = {}
+        self._task = None
+
+    def record(self, chat_id: int, user_id: int, when: datetime):
+        key = (chat_id, user_id, when.date())
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [1, when]
+        else:
+            entry[0] += 1
+            entry[1] = when
+        window = self._windows.get(chat_id)
+        if window is None:
+            window = self._windows[chat_id] = ActiveWindow()
+        window.touch(user_id, _hour(when))
+
+    def active_users(self, chat_id: int) -> int:
+        window = self._windows.get(chat_id)
+        if window is None:
+            return 0
+        return window.active(_hour(datetime.now()))
+
+    def _pending_sum(self, chat_id: int, user_id=None, day=None) -> int:
+        return sum(
+            entry[0] for (c, u, d), entry in self._pending.items()
+            if c == chat_id and (user_id is None or u == user_id) and (day is None or d == day)
+        )
+
+    async def messages_today(self, chat_id: int) -> int:
+        today = date.today()
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(
+                select(func.coalesce(func.sum(ActivityDaily.messages), 0))
+                .where(ActivityDaily.chat_id == chat_id, ActivityDaily.day == today))
+            stored = q.scalar()
+        return stored + self._pending_sum(chat_id, day=today)
+
+    async def message_count(self, chat_id: int, user_id: int) -> int:
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(
+                select(func.coalesce(func.sum(ActivityDaily.messages), 0))
+                .where(ActivityDaily.chat_id == chat_id, ActivityDaily.user_id == user_id))
+            stored = q.scalar()
+        return stored + self._pending_sum(chat_id, user_id=user_id)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"chat_id": c, "user_id": u, "day": d, "messages": n, "last_seen": seen}
+            for (c, u, d), (n, seen) in pending.items()
+        ]
+        try:
+            async with AsyncSessionLocal() as session:
+                for i in range(0, len(rows), self.batch_size):
+                    stmt = upsert_insert(ActivityDaily).values(rows[i:i + self.batch_size])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[ActivityDaily.chat_id, ActivityDaily.user_id, ActivityDaily.day],
+                        set_={
+                            "messages": ActivityDaily.messages + stmt.excluded.messages,
+                            "last_seen": stmt.excluded.last_seen,
+                        },
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except Exception:
+            # вернём несохранённое, чтобы не потерять счётчики
+            for key, (n, seen) in pending.items():
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [n, seen]
+                else:
+                    entry[0] += n
+            raise
+
+    async def _load_windows(self):
+        # час now_hour - WINDOW_HOURS делит ячейку кольца с текущим — его не берём
+        since = datetime.fromtimestamp((_hour(datetime.now()) - WINDOW_HOURS + 1) * 3600)
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(
+                select(ActivityDaily.chat_id, ActivityDaily.user_id, func.max(ActivityDaily.last_seen))
+                .where(ActivityDaily.day >= since.date(), ActivityDaily.last_seen >= since)
+                .group_by(ActivityDaily.chat_id, ActivityDaily.user_id))
+            rows = q.all()
+        for chat_id, user_id, seen in rows:
+            window = self._windows.get(chat_id)
+            if window is None:
+                window = self._windows[chat_id] = ActiveWindow()
+            window.touch(user_id, _hour(seen))
+
+    async def _run(self):
+        try:
+            await self._load_windows()
+        except Exception as e:
+            logger.exception("Could not load activity window: %s", e)
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Could not flush activity counters: %s", e)
+            now_hour = _hour(datetime.now())
+            for chat_id in list(self._windows):
+                window = self._windows[chat_id]
+                window.prune(now_hour)
+                if not window.last_hour:
+                    del self._windows[chat_id]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.exception("Could not flush activity counters: %s", e)
+
+
+activity = ActivityTracker(cfg.ACTIVITY_FLUSH_INTERVAL)
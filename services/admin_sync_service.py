@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import select, update, delete
+
+from config import cfg
+from db import AsyncSessionLocal, upsert_insert
+from models import RoleAssignment
+from services.chat_info_service import chat_info
+from services.chats_service import known_chats
+from services.roles_service import role_cache
+from services.staff_service import staff_lists
+
+logger = logging.getLogger(__name__)
+
+CREATOR_ROLE = 5
+ADMIN_ROLE = 4
+# после неудачной синхронизации по требованию права проверяются через get_chat_member
+RETRY_DELAY = 60
+
+
+class AdminSync:
+    """
+    Переносит администраторов чатов из Telegram в role_assignments.
+    Все активные чаты обходятся за interval секунд, запросы
+    get_chat_administrators равномерно разнесены по периоду, одновременно
+    выполняется не больше concurrency. Роли, выданные синхронизацией,
+    помечены synced: их можно обновить или удалить, когда человек перестал
+    быть админом. Роли, выданные вручную, не трогаются — кроме владельца,
+    который всегда получает роль 5. Чат, который ещё не синхронизировался
+    в этом процессе, синхронизируется при первой проверке прав: её ждут
+    не дольше cfg.ADMIN_SYNC_WAIT секунд, иначе статус проверяющегося
+    берётся из get_chat_member. Дальше права читаются только из role_cache.
+    """
+
+    def __init__(self, interval: float, concurrency: int):
+        self.interval = interval
+        self.concurrency = concurrency
+        self._synced_at: Dict[int, float] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._failed_at: Dict[int, float] = {}
+        self._task = None
+        # при запуске в несколько процессов: синхронизировать только свои чаты
+        self.owns = None
+
+    def sync_chat(self, bot, chat_id: int) -> asyncio.Task:
+        """
+        Запускает синхронизацию чата; одновременные вызовы получают одну задачу.
+        """
+        task = self._running.get(chat_id)
+        if task is None:
+            task = asyncio.create_task(self._sync(bot, chat_id))
+            task.add_done_callback(lambda _: self._running.pop(chat_id, None))
+            self._running[chat_id] = task
+        return task
+
+    async def ensure_synced(self, bot, chat_id: int, timeout: float) -> bool:
+        """
+        Ждёт синхронизации чата не дольше timeout секунд.
+        True — администраторы чата уже перенесены в role_assignments.
+        """
+        if chat_id in self._synced_at:
+            return True
+        # в личных чатах администраторов нет
+        if chat_id > 0:
+            return False
+        failed_at = self._failed_at.get(chat_id)
+        if failed_at is not None and time.monotonic() - failed_at < RETRY_DELAY:
+            return False
+        known_chats.register(chat_id)
+        try:
+            # по таймауту синхронизация продолжается в фоне
+            return await asyncio.wait_for(asyncio.shield(self.sync_chat(bot, chat_id)), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def role_of(self, bot, chat_id: int, user_id: int) -> int:
+        """
+        Роль пользователя в чате; 0 — роли нет.
+        """
+        role_id = await role_cache.get_role(chat_id, user_id)
+        if role_id is not None or chat_id in self._synced_at:
+            return role_id or 0
+        if await self.ensure_synced(bot, chat_id, cfg.ADMIN_SYNC_WAIT):
+            return await role_cache.get_role(chat_id, user_id) or 0
+        try:
+            member = await bot.get_chat_member(chat_id, user_id)
+        except Exception:
+            return 0
+        if member.status == "creator":
+            return CREATOR_ROLE
+        if member.status == "administrator":
+            return ADMIN_ROLE
+        return 0
+
+    async def _sync(self, bot, chat_id: int):
+        try:
+            admins = await chat_info.admins(bot, chat_id)
+        except TelegramForbiddenError:
+            await known_chats.set_active(chat_id, False)
+            return False
+        except Exception as e:
+            # следующая попытка по требованию — не раньше чем через RETRY_DELAY
+            self._failed_at[chat_id] = time.monotonic()
+            logger.warning("Could not get administrators of chat %s: %s", chat_id, e)
+            return False
+        desired = {}
+        for a in admins:
+            if a.user.is_bot:
+                continue
+            desired[a.user.id] = CREATOR_ROLE if a.status == "creator" else ADMIN_ROLE
+        await self._apply(chat_id, desired)
+        self._synced_at[chat_id] = time.monotonic()
+        self._failed_at.pop(chat_id, None)
+        return True
+
+    async def _apply(self, chat_id: int, desired: Dict[int, int]):
+        changed: Dict[int, Optional[int]] = {}
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(
+                select(RoleAssignment.user_id, RoleAssignment.role_id, RoleAssignment.synced)
+                .where(RoleAssignment.chat_id == chat_id))
+            existing = {user_id: (role_id, synced) for user_id, role_id, synced in q.all()}
+
+            removed = [uid for uid, (_, synced) in existing.items() if synced and uid not in desired]
+            if removed:
+                await session.execute(
+                    delete(RoleAssignment)
+                    .where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id.in_(removed),
+                           RoleAssignment.synced == True))
+                changed.update(dict.fromkeys(removed))
+
+            for user_id, role_id in desired.items():
+                current = existing.get(user_id)
+                if current is None:
+                    stmt = upsert_insert(RoleAssignment).values(
+                        chat_id=chat_id, user_id=user_id, role_id=role_id, assigned_by=None, synced=True)
+                    await session.execute(stmt.on_conflict_do_nothing(
+                        index_elements=[RoleAssignment.chat_id, RoleAssignment.user_id]))
+                elif current[0] != role_id and (current[1] or role_id == CREATOR_ROLE):
+                    await session.execute(
+                        update(RoleAssignment)
+                        .where(RoleAssignment.chat_id == chat_id, RoleAssignment.user_id == user_id)
+                        .values(role_id=role_id, synced=True))
+                else:
+                    continue
+                changed[user_id] = role_id
+            await session.commit()
+
+        for user_id, role_id in changed.items():
+            if role_id is None:
+                role_cache.remove_role(chat_id, user_id)
+            else:
+                role_cache.set_role(chat_id, user_id, role_id)
+        if changed:
+            staff_lists.invalidate(chat_id)
+            logger.info("Admin sync for chat %s: %s roles changed", chat_id, len(changed))
+
+    def _due(self, chat_id: int, now: float) -> bool:
+        # known_chats хранит и личные чаты после /start
+        if chat_id > 0:
+            return False
+        if self.owns is not None and not self.owns(chat_id):
+            return False
+        if not known_chats.is_active(chat_id):
+            return False
+        # чаты, синхронизированные по требованию, ждут следующего периода
+        synced_at = self._synced_at.get(chat_id)
+        return synced_at is None or now - synced_at >= self.interval / 2
+
+    async def _cycle(self, bot):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        now = time.monotonic()
+        chat_ids = [c for c in known_chats if self._due(c, now)]
+        step = self.interval / max(1, len(chat_ids))
+        sem = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        for i, chat_id in enumerate(chat_ids):
+            delay = started + i * step - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await sem.acquire()
+            task = self.sync_chat(bot, chat_id)
+            task.add_done_callback(lambda _: sem.release())
+            tasks.add(task)
+            tasks = {t for t in tasks if not t.done()}
+        if tasks:
+            await asyncio.wait(tasks)
+        logger.info("Admin sync cycle: %s chats in %.1fs", len(chat_ids), loop.time() - started)
+        remaining = started + self.interval - loop.time()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    async def _run(self, bot):
+        await known_chats.loaded.wait()
+        while True:
+            try:
+                await self._cycle(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Admin sync cycle failed: %s", e)
+                await asyncio.sleep(60)
+
+    def start(self, bot):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        tasks = [t for t in (self._task, *self._running.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+admin_sync = AdminSync(cfg.ADMIN_SYNC_INTERVAL, cfg.ADMIN_SYNC_CONCURRENCY)
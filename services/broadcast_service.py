@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import select, update
+
+from config import cfg
+from db import AsyncSessionLocal
+from models import Broadcast, Chat
+from services.chats_service import known_chats
+
+logger = logging.getLogger(__name__)
+
+# Ошибки BadRequest, после которых писать в чат больше нет смысла
+GONE_MARKERS = ("chat not found", "bot was kicked", "not enough rights", "have no rights",
+                "group chat was upgraded", "chat_write_forbidden")
+
+
+class BroadcastService:
+    """
+    Рассылка текста по всем активным чатам из таблицы chats.
+    Чаты читаются порциями по возрастанию id, порция отправляется параллельно
+    (не больше concurrency запросов одновременно; темп задаёт rate_limiter
+    сессии бота). После каждой порции в broadcasts сохраняются счётчики и id
+    последнего чата, поэтому после перезапуска рассылка продолжается с места
+    остановки: повторно может уйти только незавершённая порция.
+    """
+
+    def __init__(self, chunk_size: int, concurrency: int):
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def create(self, bot, text: str, created_by: int, report_chat_id: int) -> int:
+        async with AsyncSessionLocal() as session:
+            b = Broadcast(text=text, created_by=created_by, report_chat_id=report_chat_id)
+            session.add(b)
+            await session.commit()
+            broadcast_id = b.id
+        self._spawn(bot, broadcast_id)
+        return broadcast_id
+
+    async def resume(self, bot):
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(select(Broadcast.id).where(Broadcast.finished_at.is_(None)))
+            ids = q.scalars().all()
+        for broadcast_id in ids:
+            logger.info("Resuming broadcast %s", broadcast_id)
+            self._spawn(bot, broadcast_id)
+
+    def _spawn(self, bot, broadcast_id: int):
+        if broadcast_id not in self._tasks:
+            task = asyncio.create_task(self._run(bot, broadcast_id))
+            task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+            self._tasks[broadcast_id] = task
+
+    async def _send(self, bot, chat_id: int, text: str, sem: asyncio.Semaphore) -> str:
+        async with sem:
+            try:
+                await bot.send_message(chat_id, text, parse_mode=cfg.PARSE_MODE)
+                return "sent"
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramBadRequest as e:
+                if any(m in str(e).lower() for m in GONE_MARKERS):
+                    return "blocked"
+                logger.warning("Broadcast to %s failed: %s", chat_id, e)
+                return "failed"
+            except Exception as e:
+                logger.warning("Broadcast to %s failed: %s", chat_id, e)
+                return "failed"
+
+    async def _next_chunk(self, after) -> List[int]:
+        async with AsyncSessionLocal() as session:
+            stmt = select(Chat.id).where(Chat.active == True).order_by(Chat.id).limit(self.chunk_size)
+            if after is not None:
+                stmt = stmt.where(Chat.id > after)
+            q = await session.execute(stmt)
+            return q.scalars().all()
+
+    async def _save_chunk(self, broadcast_id: int, last_chat_id: int, counts: Dict[str, int],
+                          gone: List[int]):
+        async with AsyncSessionLocal() as session:
+            if gone:
+                await session.execute(
+                    update(Chat).where(Chat.id.in_(gone)).values(active=False)
+                    .execution_options(synchronize_session=False))
+            await session.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id).values(
+                    last_chat_id=last_chat_id,
+                    sent=Broadcast.sent + counts["sent"],
+                    failed=Broadcast.failed + counts["failed"],
+                    blocked=Broadcast.blocked + counts["blocked"],
+                ).execution_options(synchronize_session=False))
+            await session.commit()
+        known_chats.mark_inactive(gone)
+
+    async def _run(self, bot, broadcast_id: int):
+        try:
+            async with AsyncSessionLocal() as session:
+                b = await session.get(Broadcast, broadcast_id)
+            if b is None or b.finished_at is not None:
+                return
+            sem = asyncio.Semaphore(self.concurrency)
+            started = time.monotonic()
+            sent_now = 0
+            after = b.last_chat_id
+            while True:
+                chat_ids = await self._next_chunk(after)
+                if not chat_ids:
+                    break
+                results = await asyncio.gather(*(self._send(bot, cid, b.text, sem) for cid in chat_ids))
+                counts = {"sent": 0, "failed": 0, "blocked": 0}
+                gone = []
+                for cid, result in zip(chat_ids, results):
+                    counts[result] += 1
+                    if result == "blocked":
+                        gone.append(cid)
+                after = chat_ids[-1]
+                await self._save_chunk(broadcast_id, after, counts, gone)
+                sent_now += len(chat_ids)
+
+            elapsed = time.monotonic() - started
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(Broadcast).where(Broadcast.id == broadcast_id)
+                    .values(finished_at=datetime.utcnow()))
+                await session.commit()
+                b = await session.get(Broadcast, broadcast_id)
+            logger.info("Broadcast %s finished: sent=%s failed=%s blocked=%s in %.1fs",
+                        broadcast_id, b.sent, b.failed, b.blocked, elapsed)
+            if b.report_chat_id:
+                rate = sent_now / elapsed if elapsed > 0 else 0.0
+                await bot.send_message(
+                    b.report_chat_id,
+                    f"<b>📨 Рассылка #{broadcast_id} завершена</b>\n"
+                    f"┌─ <b>Доставлено:</b> {b.sent}\n"
+                    f"├─ <b>Ошибок:</b> {b.failed}\n"
+                    f"├─ <b>Бот удалён или заблокирован:</b> {b.blocked}\n"
+                    f"└─ <b>Скорость:</b> {rate:.1f} чат/с за {elapsed:.1f} с",
+                    parse_mode=cfg.PARSE_MODE,
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Broadcast %s stopped: %s", broadcast_id, e)
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+broadcasts = BroadcastService(cfg.BROADCAST_CHUNK_SIZE, cfg.BROADCAST_CONCURRENCY)
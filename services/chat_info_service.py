@@ -0,0 +1,81 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import cfg
+
+
+@dataclass
+class ChatInfo:
+    chat: Optional[Any]
+    member_count: Optional[int]
+    admins: Optional[List[Any]]
+
+
+class ChatInfoService:
+    """
+    Сведения о чате из Bot API: get_chat, get_chat_member_count и
+    get_chat_administrators. Каждая часть кэшируется на ttl секунд, части
+    запрашиваются параллельно, а одновременные запросы одной части одного
+    чата ждут один общий вызов API. Ошибки не кэшируются.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache: "OrderedDict[Tuple[int, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+
+    def _call(self, bot, chat_id: int, part: str):
+        if part == "chat":
+            return bot.get_chat(chat_id)
+        if part == "count":
+            return bot.get_chat_member_count(chat_id)
+        return bot.get_chat_administrators(chat_id)
+
+    async def _fetch(self, bot, key: Tuple[int, str]):
+        value = await self._call(bot, key[0], key[1])
+        self._cache[key] = (time.monotonic() + self.ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return value
+
+    async def _get(self, bot, chat_id: int, part: str):
+        key = (chat_id, part)
+        item = self._cache.get(key)
+        if item is not None and item[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            return item[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(bot, key))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._inflight[key] = task
+        # отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    async def admins(self, bot, chat_id: int) -> List[Any]:
+        """
+        Администраторы чата; ошибки API пробрасываются вызывающему.
+        """
+        return await self._get(bot, chat_id, "admins")
+
+    async def get(self, bot, chat_id: int) -> ChatInfo:
+        chat, count, admins = await asyncio.gather(
+            *(self._get(bot, chat_id, part) for part in ("chat", "count", "admins")),
+            return_exceptions=True)
+        return ChatInfo(
+            chat=None if isinstance(chat, Exception) else chat,
+            member_count=None if isinstance(count, Exception) else count,
+            admins=None if isinstance(admins, Exception) else admins,
+        )
+
+    def invalidate(self, chat_id: int, part: Optional[str] = None):
+        for p in ((part,) if part else ("chat", "count", "admins")):
+            self._cache.pop((chat_id, p), None)
+
+
+chat_info = ChatInfoService(cfg.CHAT_INFO_TTL, cfg.CHAT_INFO_CACHE_SIZE)
@@ -0,0 +1,165 @@
+import asyncio
+import bisect
+import logging
+from array import array
+from typing import Iterable, Set
+
+from sqlalchemy import select
+
+from config import cfg
+from db import AsyncSessionLocal, upsert_insert
+from models import Chat
+
+logger = logging.getLogger(__name__)
+
+
+class KnownChats:
+    """
+    Множество id чатов из таблицы chats в памяти.
+    Загруженные при старте id лежат в отсортированном array('q') — 8 байт на чат,
+    поиск бинарный. Новые чаты сначала попадают в небольшое множество, пачками
+    пишутся в БД через INSERT ... ON CONFLICT DO NOTHING и время от времени
+    вливаются в массив. Чаты с active = false хранятся отдельно (их мало).
+    """
+
+    def __init__(self, flush_interval: float, merge_threshold: int = 1024, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.merge_threshold = merge_threshold
+        self.batch_size = batch_size
+        self._ids = array("q")
+        self._recent: Set[int] = set()
+        self._pending: Set[int] = set()
+        self._inactive: Set[int] = set()
+        self._task = None
+        self.loaded = asyncio.Event()
+
+    def __len__(self):
+        return len(self._ids) + len(self._recent)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._recent or self._in_ids(chat_id)
+
+    def _in_ids(self, chat_id: int) -> bool:
+        i = bisect.bisect_left(self._ids, chat_id)
+        return i < len(self._ids) and self._ids[i] == chat_id
+
+    def __iter__(self):
+        yield from self._ids
+        yield from list(self._recent)
+
+    def register(self, chat_id: int):
+        """
+        Отмечает чат известным; в БД он попадёт при следующем сбросе.
+        """
+        if chat_id in self:
+            return
+        self._recent.add(chat_id)
+        self._pending.add(chat_id)
+        if len(self._recent) >= self.merge_threshold:
+            self._merge()
+
+    def is_active(self, chat_id: int) -> bool:
+        return chat_id not in self._inactive
+
+    async def set_active(self, chat_id: int, active: bool):
+        """
+        Запоминает, может ли бот писать в чат. В БД идёт только смена состояния.
+        """
+        if chat_id in self and self.is_active(chat_id) == active:
+            return
+        stmt = upsert_insert(Chat).values(id=chat_id, active=active)
+        stmt = stmt.on_conflict_do_update(index_elements=[Chat.id], set_={"active": active})
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+        self._recent.add(chat_id)
+        self._pending.discard(chat_id)
+        if active:
+            self._inactive.discard(chat_id)
+        else:
+            self._inactive.add(chat_id)
+
+    def mark_inactive(self, chat_ids: Iterable[int]):
+        """
+        Для тех, кто уже записал active = false в БД сам (рассылка).
+        """
+        self._inactive.update(chat_ids)
+
+    def _merge(self):
+        self._ids = self._merge_sorted(sorted(self._recent))
+        self._recent.clear()
+
+    def _merge_sorted(self, new_ids):
+        out = array("q")
+        ids = self._ids
+        i = 0
+        for chat_id in new_ids:
+            j = bisect.bisect_left(ids, chat_id, i)
+            out.extend(ids[i:j])
+            if j >= len(ids) or ids[j] != chat_id:
+                out.append(chat_id)
+            i = j
+        out.extend(ids[i:])
+        return out
+
+    async def load(self):
+        ids = array("q")
+        inactive = set()
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(select(Chat.id, Chat.active).order_by(Chat.id).execution_options(yield_per=10000))
+            async for chat_id, active in result:
+                ids.append(chat_id)
+                if not active:
+                    inactive.add(chat_id)
+        self._ids = ids
+        self._inactive |= inactive
+        # всё, что успели зарегистрировать до окончания загрузки, остаётся в _recent
+        self._recent = {c for c in self._recent if not self._in_ids(c)}
+        logger.info("Loaded %s known chats (%s inactive)", len(ids), len(inactive))
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = sorted(self._pending), set()
+        try:
+            async with AsyncSessionLocal() as session:
+                for i in range(0, len(pending), self.batch_size):
+                    stmt = upsert_insert(Chat).values([{"id": c} for c in pending[i:i + self.batch_size]])
+                    await session.execute(stmt.on_conflict_do_nothing(index_elements=[Chat.id]))
+                await session.commit()
+        except Exception:
+            self._pending.update(pending)
+            raise
+
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.exception("Could not load known chats: %s", e)
+        self.loaded.set()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Could not register new chats: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.exception("Could not register new chats: %s", e)
+
+
+known_chats = KnownChats(cfg.CHATS_FLUSH_INTERVAL)
@@ -0,0 +1,115 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select, update
+
+from db import AsyncSessionLocal
+from models import Warn, Mute, Ban
+
+logger = logging.getLogger(__name__)
+
+MODELS = {model.__tablename__: model for model in (Warn, Mute, Ban)}
+
+
+class ExpiryScheduler:
+    """
+    Снимает флаг active у предупреждений, мутов и банов, у которых истёк until.
+    Сроки хранятся в min-куче (until, таблица, id). При старте куча заполняется
+    из БД, включая уже просроченные записи, поэтому после перезапуска ничего
+    не теряется. UPDATE выполняется только для active-строк, так что повторная
+    обработка или ручное снятие наказания безопасны.
+    """
+
+    def __init__(self, batch_size: int = 500, max_sleep: float = 60.0):
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self._heap: List[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # при запуске в несколько процессов: обрабатывать только свои чаты
+        self.owns = None
+
+    def schedule(self, model, row_id: int, until: datetime):
+        if until is None:
+            return
+        entry = (until, model.__tablename__, row_id)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    async def _load(self):
+        async with AsyncSessionLocal() as session:
+            for table, model in MODELS.items():
+                q = await session.execute(
+                    select(model.id, model.until, model.chat_id).where(model.active == True, model.until.isnot(None)))
+                for row_id, until, chat_id in q.all():
+                    if self.owns is None or self.owns(chat_id):
+                        self._heap.append((until, table, row_id))
+        heapq.heapify(self._heap)
+        logger.info("Expiry scheduler loaded %s deadlines", len(self._heap))
+
+    def _pop_due(self, now: datetime) -> Dict[str, List[int]]:
+        due: Dict[str, List[int]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, table, row_id = heapq.heappop(self._heap)
+            due.setdefault(table, []).append(row_id)
+        return due
+
+    async def _deactivate(self, due: Dict[str, List[int]]):
+        async with AsyncSessionLocal() as session:
+            for table, ids in due.items():
+                model = MODELS[table]
+                for i in range(0, len(ids), self.batch_size):
+                    chunk = ids[i:i + self.batch_size]
+                    await session.execute(
+                        update(model)
+                        .where(model.id.in_(chunk), model.active == True)
+                        .values(active=False)
+                        .execution_options(synchronize_session=False))
+            await session.commit()
+
+    async def _run(self):
+        await self._load()
+        while True:
+            now = datetime.now()
+            due = self._pop_due(now)
+            if due:
+                try:
+                    await self._deactivate(due)
+                    logger.info("Expired punishments: %s", {t: len(ids) for t, ids in due.items()})
+                except Exception as e:
+                    logger.exception("Could not deactivate expired punishments: %s", e)
+                    # вернём в кучу и попробуем позже
+                    for table, ids in due.items():
+                        for row_id in ids:
+                            heapq.heappush(self._heap, (now, table, row_id))
+                    await asyncio.sleep(5)
+                    continue
+
+            timeout = self.max_sleep
+            if self._heap:
+                timeout = min(timeout, max(0.0, (self._heap[0][0] - datetime.now()).total_seconds()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+expiry = ExpiryScheduler()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from collections import deque
+from typing import List, Optional
+
+from config import cfg
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    i = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[i]
+
+
+class LatencySampler:
+    """
+    Задержка Bot API и отставание event loop для команд ping.
+    В кольцевой буфер попадают длительности реальных запросов к API (их
+    пишет ApiMetricsMiddleware) и, если запросов давно не было, пробный
+    get_me раз в probe_interval секунд. Отставание цикла — насколько позже
+    просыпается asyncio.sleep(lag_interval), чем должен.
+    """
+
+    def __init__(self, size: int, probe_interval: float, lag_interval: float = 1.0):
+        self.probe_interval = probe_interval
+        self.lag_interval = lag_interval
+        self._api = deque(maxlen=size)
+        self._lag = deque(maxlen=size)
+        self._recorded = 0
+        self._task = None
+
+    def record(self, seconds: float):
+        self._api.append(seconds)
+        self._recorded += 1
+
+    def recent(self, n: int) -> List[int]:
+        return [int(s * 1000) for s in list(self._api)[-n:]]
+
+    def api_stats(self) -> Optional[dict]:
+        """
+        p50/p95/p99 и джиттер (среднее изменение между соседними замерами), мс.
+        """
+        samples = list(self._api)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        jitter = sum(abs(b - a) for a, b in zip(samples, samples[1:])) / max(1, len(samples) - 1)
+        return {
+            "count": len(samples),
+            "p50": int(_percentile(ordered, 0.50) * 1000),
+            "p95": int(_percentile(ordered, 0.95) * 1000),
+            "p99": int(_percentile(ordered, 0.99) * 1000),
+            "jitter": int(jitter * 1000),
+        }
+
+    def loop_lag(self) -> Optional[dict]:
+        samples = sorted(self._lag)
+        if not samples:
+            return None
+        return {"p50": int(_percentile(samples, 0.50) * 1000), "max": int(samples[-1] * 1000)}
+
+    def verdict(self, stats: Optional[dict] = None):
+        """
+        (статус, рекомендация) по текущему буферу.
+        """
+        stats = stats or self.api_stats()
+        if stats is None:
+            return "⏳ Нет данных", "Замеры ещё не собраны, попробуйте через минуту."
+        lag = self.loop_lag()
+        if lag is not None and lag["p50"] > 100:
+            return "🔴 Бот перегружен", "Бот не успевает обрабатывать обновления, ответы будут с задержкой."
+        if stats["p99"] > 2000 or stats["p50"] > 1000:
+            return "🔴 Нестабильный", "Telegram отвечает медленно, возможны задержки команд."
+        if stats["p95"] > 3 * max(stats["p50"], 50) or stats["jitter"] > max(stats["p50"], 50):
+            return "🟡 Скачет", "Задержка сильно меняется, отдельные ответы могут приходить с опозданием."
+        return "✅ Стабильный", "Все отлично!"
+
+    async def measure(self, bot) -> int:
+        """
+        Один пробный запрос; длительность попадает в буфер через ApiMetricsMiddleware.
+        """
+        t0 = asyncio.get_running_loop().time()
+        try:
+            await bot.get_me()
+        except Exception as e:
+            logger.debug("Latency probe failed: %s", e)
+        return int((asyncio.get_running_loop().time() - t0) * 1000)
+
+    async def _run(self, bot):
+        loop = asyncio.get_running_loop()
+        last_probe = loop.time()
+        seen = self._recorded
+        await self.measure(bot)
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            now = loop.time()
+            self._lag.append(max(0.0, now - t0 - self.lag_interval))
+            if now - last_probe >= self.probe_interval:
+                # живой трафик уже даёт замеры — лишний запрос не нужен
+                if self._recorded == seen:
+                    await self.measure(bot)
+                last_probe = loop.time()
+                seen = self._recorded
+
+    def start(self, bot):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+latency = LatencySampler(cfg.LATENCY_SAMPLES, cfg.LATENCY_PROBE_INTERVAL)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+
+from config import cfg
+from db import AsyncSessionLocal, upsert_insert
+from models import Membership
+
+logger = logging.getLogger(__name__)
+
+PRESENT_STATUSES = ("creator", "administrator", "member", "restricted")
+
+
+def member_status(member) -> str:
+    # restricted без is_member — ограниченный пользователь, который уже вышел
+    status = member.status
+    if status == "restricted" and not getattr(member, "is_member", True):
+        return "left"
+    return status
+
+
+class MembersStore:
+    """
+    Статусы пользователей в чатах. Обновления chat_member и ответы
+    get_chat_member попадают в LRU-кэш (chat_id, user_id) -> статус, в БД
+    изменения уходят пачками upsert'ов раз в flush_interval секунд.
+    Промах кэша читается из chat_members; None — пользователь боту не известен.
+    """
+
+    def __init__(self, max_size: int, flush_interval: float, batch_size: int = 500):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._cache: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+        self._pending: Dict[Tuple[int, int], dict] = {}
+        self._task = None
+
+    def _put(self, key: Tuple[int, int], status: str):
+        self._cache[key] = status
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def record(self, chat_id: int, user_id: int, status: str, joined_at: Optional[datetime] = None):
+        key = (chat_id, user_id)
+        self._put(key, status)
+        prev = self._pending.get(key)
+        if joined_at is None and prev is not None:
+            joined_at = prev["joined_at"]
+        self._pending[key] = {"chat_id": chat_id, "user_id": user_id, "status": status,
+                              "joined_at": joined_at, "updated_at": datetime.utcnow()}
+
+    def record_member(self, chat_id: int, member) -> str:
+        status = member_status(member)
+        self.record(chat_id, member.user.id, status)
+        return status
+
+    def on_update(self, event):
+        old = member_status(event.old_chat_member)
+        new = member_status(event.new_chat_member)
+        joined_at = None
+        if new in PRESENT_STATUSES and old not in PRESENT_STATUSES:
+            joined_at = event.date.replace(tzinfo=None)
+        self.record(event.chat.id, event.new_chat_member.user.id, new, joined_at)
+
+    async def get_status(self, chat_id: int, user_id: int) -> Optional[str]:
+        key = (chat_id, user_id)
+        status = self._cache.get(key)
+        if status is not None:
+            self._cache.move_to_end(key)
+            return status
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(
+                select(Membership.status).where(Membership.chat_id == chat_id, Membership.user_id == user_id))
+            status = q.scalar()
+        # запись могла появиться, пока шёл запрос
+        if key in self._cache:
+            return self._cache[key]
+        if status is not None:
+            self._put(key, status)
+        return status
+
+    async def joined_since(self, chat_id: int, since: datetime) -> List[int]:
+        """
+        Кто вошёл в чат не раньше since (UTC) и всё ещё в нём.
+        """
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(
+                select(Membership.user_id, Membership.status)
+                .where(Membership.chat_id == chat_id, Membership.joined_at >= since))
+            statuses = dict(q.all())
+        # ещё не сброшенные изменения новее того, что лежит в БД
+        for (c, user_id), row in self._pending.items():
+            if c != chat_id:
+                continue
+            if row["joined_at"] is not None and row["joined_at"] >= since or user_id in statuses:
+                statuses[user_id] = row["status"]
+        return [user_id for user_id, status in statuses.items() if status in PRESENT_STATUSES]
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = list(pending.values())
+        try:
+            async with AsyncSessionLocal() as session:
+                for i in range(0, len(rows), self.batch_size):
+                    stmt = upsert_insert(Membership).values(rows[i:i + self.batch_size])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[Membership.chat_id, Membership.user_id],
+                        set_={
+                            "status": stmt.excluded.status,
+                            "updated_at": stmt.excluded.updated_at,
+                            # ответ get_chat_member не знает времени входа — оставляем прежнее
+                            "joined_at": func.coalesce(stmt.excluded.joined_at, Membership.joined_at),
+                        },
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except Exception:
+            for key, row in pending.items():
+                newer = self._pending.setdefault(key, row)
+                if newer["joined_at"] is None:
+                    newer["joined_at"] = row["joined_at"]
+            raise
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Could not flush chat members: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.exception("Could not flush chat members: %s", e)
+
+
+members = MembersStore(cfg.MEMBERS_CACHE_SIZE, cfg.MEMBERS_FLUSH_INTERVAL)
@@ -0,0 +1,241 @@
+import bisect
+import logging
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import cfg
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0.0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self):
+        lines = self.header()
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels_text(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, doc, labels)
+        self.values: Dict[tuple, float] = {}
+        self.func = func
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def get(self, *labels) -> Optional[float]:
+        if self.func is not None:
+            return self.func()
+        return self.values.get(labels)
+
+    def render(self):
+        lines = self.header()
+        if self.func is not None:
+            lines.append(f"{self.name} {self.func()}")
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels_text(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        # на набор меток: [счётчики по корзинам..., +Inf], сумма
+        self.values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def count(self, *labels) -> int:
+        entry = self.values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def mean(self, *labels) -> Optional[float]:
+        entry = self.values.get(labels)
+        if not entry or not sum(entry[0]):
+            return None
+        return entry[1] / sum(entry[0])
+
+    def overall_mean(self) -> Optional[float]:
+        n = sum(sum(counts) for counts, _ in self.values.values())
+        if not n:
+            return None
+        return sum(total for _, total in self.values.values()) / n
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels_text(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+updates_total = registry.add(Counter("bot_updates_total", "Processed updates", ("type",)))
+update_seconds = registry.add(Histogram("bot_update_seconds", "Full update processing time", ("type",)))
+handler_seconds = registry.add(Histogram("bot_handler_seconds", "Handler latency", ("handler",)))
+update_db_queries = registry.add(Histogram("bot_update_db_queries", "DB queries per update", (), COUNT_BUCKETS))
+update_db_seconds = registry.add(Histogram("bot_update_db_seconds", "DB time per update"))
+db_queries_total = registry.add(Counter("bot_db_queries_total", "DB queries"))
+db_query_seconds_total = registry.add(Counter("bot_db_query_seconds_total", "Time spent in DB queries"))
+api_seconds = registry.add(Histogram("bot_api_request_seconds", "Bot API request latency", ("method",)))
+api_errors_total = registry.add(Counter("bot_api_errors_total", "Bot API errors", ("method", "error")))
+errors_total = registry.add(Counter("bot_errors_total", "Errors: unhandled in updates and logged with level ERROR"))
+last_error = registry.add(Gauge("bot_last_error_timestamp_seconds", "Unix time of the last error"))
+api_queue_depth = registry.add(Gauge("bot_api_queue_depth", "Bot API requests waiting in the rate limiter"))
+started_at = registry.add(Gauge("bot_start_timestamp_seconds", "Unix time the process started"))
+started_at.set(time.time())
+
+# Счётчик запросов к БД в рамках текущего обновления: [кол-во, секунды]
+current_db_stats: ContextVar[Optional[list]] = ContextVar("current_db_stats", default=None)
+
+
+def record_error(when: Optional[float] = None):
+    errors_total.inc()
+    last_error.set(when or time.time())
+
+
+def record_db_query(seconds: float):
+    db_queries_total.inc()
+    db_query_seconds_total.inc(amount=seconds)
+    stats = current_db_stats.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+
+
+def last_error_time() -> Optional[float]:
+    return last_error.get()
+
+
+class ErrorLogHandler(logging.Handler):
+    """
+    Отмечает в метриках каждую запись лога уровня ERROR и выше:
+    хендлеры ловят исключения сами и пишут их через logger.exception.
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord):
+        record_error(record.created)
+
+
+def instrument_engine(engine):
+    """
+    Считает запросы к БД и их время; в рамках обновления — ещё и в current_db_stats.
+    """
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if starts:
+            record_db_query(time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+async def handle_metrics(request):
+    from aiohttp import web
+
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str = cfg.METRICS_HOST, port: int = cfg.METRICS_PORT):
+    """
+    Поднимает HTTP-эндпоинт /metrics в формате Prometheus. Порт 0 — не поднимать.
+    """
+    if not port:
+        return None
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics endpoint on http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+
+from config import cfg
+from db import AsyncSessionLocal
+from models import Nick
+
+
+def user_link(user_id: int, display: str) -> str:
+    return f'<a href="tg://user?id={user_id}">{display}</a>'
+
+
+class NameResolver:
+    """
+    Отображаемые имена пользователей: ник из БД, иначе full_name из Telegram.
+    Ники для пачки пользователей берутся одним IN-запросом, недостающие имена
+    запрашиваются у API параллельно (не больше api_concurrency одновременно).
+    Результаты живут в LRU-кэше ttl секунд; смена ника сбрасывает запись.
+    """
+
+    def __init__(self, max_size: int, ttl: float, api_concurrency: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._api_semaphore = asyncio.Semaphore(api_concurrency)
+
+    def _get_cached(self, chat_id: int, user_id: int):
+        key = (chat_id, user_id)
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        display, expires_at = item
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return display
+
+    def _put(self, chat_id: int, user_id: int, display: str):
+        key = (chat_id, user_id)
+        self._cache[key] = (display, time.monotonic() + self.ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, chat_id: int, user_id: int):
+        self._cache.pop((chat_id, user_id), None)
+
+    async def _fetch_member_name(self, chat_id: int, user_id: int, bot):
+        async with self._api_semaphore:
+            try:
+                member = await bot.get_chat_member(chat_id, user_id)
+                return member.user.full_name
+            except Exception:
+                return None
+
+    async def resolve_many(self, chat_id: int, user_ids: Iterable[int], bot) -> Dict[int, str]:
+        result: Dict[int, str] = {}
+        missing: List[int] = []
+        for user_id in dict.fromkeys(user_ids):
+            display = self._get_cached(chat_id, user_id)
+            if display is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = display
+        if not missing:
+            return result
+
+        try:
+            async with AsyncSessionLocal() as session:
+                q = await session.execute(
+                    select(Nick.user_id, Nick.nick)
+                    .where(Nick.chat_id == chat_id, Nick.user_id.in_(missing))
+                    .order_by(Nick.id))
+                for user_id, nick in q.all():
+                    if user_id not in result:
+                        result[user_id] = nick
+                        self._put(chat_id, user_id, nick)
+        except Exception:
+            pass
+
+        unnamed = [user_id for user_id in missing if user_id not in result]
+        names = await asyncio.gather(*(self._fetch_member_name(chat_id, user_id, bot) for user_id in unnamed))
+        for user_id, display in zip(unnamed, names):
+            if display is None:
+                # ошибки не кэшируем, чтобы при следующем запросе попробовать снова
+                result[user_id] = str(user_id)
+            else:
+                result[user_id] = display
+                self._put(chat_id, user_id, display)
+        return result
+
+    async def resolve(self, chat_id: int, user_id: int, bot) -> str:
+        names = await self.resolve_many(chat_id, [user_id], bot)
+        return names[user_id]
+
+
+names = NameResolver(cfg.NAMES_CACHE_SIZE, cfg.NAMES_CACHE_TTL, cfg.NAMES_API_CONCURRENCY)
+
+
+async def format_user_link(chat_id: int, user_id: int, bot) -> str:
+    return user_link(user_id, await names.resolve(chat_id, user_id, bot))
+
+
+async def format_user_links(chat_id: int, user_ids: Iterable[int], bot) -> Dict[int, str]:
+    resolved = await names.resolve_many(chat_id, user_ids, bot)
+    return {user_id: user_link(user_id, display) for user_id, display in resolved.items()}
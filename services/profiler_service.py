@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Optional
+
+from config import cfg
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _where(code, lineno: int) -> str:
+    path = code.co_filename
+    if path.startswith(REPO_DIR):
+        path = os.path.relpath(path, REPO_DIR)
+    else:
+        # для библиотек достаточно пути внутри site-packages
+        marker = "site-packages" + os.sep
+        if marker in path:
+            path = path.split(marker, 1)[1]
+    return f"{path}:{lineno} {code.co_name}"
+
+
+class ProfileSession:
+    def __init__(self, max_updates: Optional[int], max_seconds: float, on_done: Callable):
+        self.max_updates = max_updates
+        self.max_seconds = max_seconds
+        self.on_done = on_done
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.updates = 0
+        self.samples = 0
+        self.calls: Dict[str, list] = defaultdict(list)
+        # имя хендлера -> Counter(место в коде)
+        self.leaf: Dict[str, Counter] = defaultdict(Counter)
+        self.own: Dict[str, Counter] = defaultdict(Counter)
+        self.handler_samples: Counter = Counter()
+
+
+class Profiler:
+    """
+    Выборочный профилировщик хендлеров. Пока сессии нет, middleware делает
+    одну проверку атрибута, а поток выборок не запущен.
+    Во время сессии отдельный поток каждые interval секунд снимает стек
+    основного потока и относит выборку к хендлеру, чей код в нём найден;
+    middleware дополнительно замеряет полное время каждого вызова хендлера,
+    включая ожидание БД и Bot API. На время сессии уменьшается интервал
+    переключения GIL, иначе поток выборок ждал бы его до 5 мс.
+    """
+
+    def __init__(self, interval: float, max_seconds: float):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.session: Optional[ProfileSession] = None
+        self._handler_codes: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._main_thread_id = threading.main_thread().ident
+        self._switch_interval: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.session is not None
+
+    def start(self, on_done: Callable, max_updates: Optional[int] = None, seconds: Optional[float] = None):
+        if self.session is not None:
+            raise RuntimeError("profiling is already running")
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        self.session = ProfileSession(max_updates, seconds, on_done)
+        self._main_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 10))
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+        self._timer = asyncio.get_running_loop().call_later(seconds, self.finish)
+
+    def handler_started(self, callback) -> float:
+        code = getattr(callback, "__code__", None)
+        if code is not None and code not in self._handler_codes:
+            self._handler_codes[code] = callback.__name__
+        return time.perf_counter()
+
+    def handler_finished(self, callback, started: float):
+        session = self.session
+        if session is None:
+            return
+        session.calls[getattr(callback, "__name__", "unknown")].append(time.perf_counter() - started)
+        session.updates += 1
+        if session.max_updates and session.updates >= session.max_updates:
+            self.finish()
+
+    def _sample_loop(self):
+        session = self.session
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._main_thread_id)
+            if frame is None:
+                continue
+            session.samples += 1
+            leaf = frame
+            own = None
+            handler = None
+            while frame is not None:
+                code = frame.f_code
+                if own is None and code.co_filename.startswith(REPO_DIR) and code.co_filename != __file__:
+                    own = (code, frame.f_lineno)
+                name = self._handler_codes.get(code)
+                if name is not None:
+                    handler = name
+                    break
+                frame = frame.f_back
+            if handler is None:
+                continue
+            session.handler_samples[handler] += 1
+            session.leaf[handler][_where(leaf.f_code, leaf.f_lineno)] += 1
+            if own is not None:
+                session.own[handler][_where(*own)] += 1
+
+    def finish(self):
+        session = self.session
+        if session is None:
+            return
+        self.session = None
+        session.finished = time.monotonic()
+        self._stop.set()
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        thread, self._thread = self._thread, None
+
+        async def _done():
+            if thread is not None:
+                await asyncio.to_thread(thread.join)
+            try:
+                await session.on_done(self.report(session))
+            except Exception as e:
+                logger.exception("Could not deliver profile report: %s", e)
+
+        asyncio.get_running_loop().create_task(_done())
+
+    def report(self, session: ProfileSession, top: int = 15) -> str:
+        elapsed = (session.finished or time.monotonic()) - session.started
+        in_handlers = sum(session.handler_samples.values())
+        lines = [
+            f"Профиль: {session.updates} вызовов хендлеров за {elapsed:.1f} с",
+            f"Выборок: {session.samples} (шаг {self.interval * 1000:.0f} мс), в коде хендлеров: {in_handlers}",
+            "Выборка попадает в хендлер, только когда он выполняется в потоке;",
+            "ожидание БД и Bot API видно по разнице полного времени и числа выборок.",
+            "",
+        ]
+        order = sorted(session.calls, key=lambda name: -sum(session.calls[name]))
+        for name in order:
+            durations = sorted(session.calls[name])
+            total = sum(durations)
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            samples = session.handler_samples.get(name, 0)
+            lines.append(
+                f"== {name}: вызовов {len(durations)}, всего {total * 1000:.1f} мс, "
+                f"среднее {total / len(durations) * 1000:.1f} мс, p95 {p95 * 1000:.1f} мс, "
+                f"выборок {samples} (~{samples * self.interval * 1000:.0f} мс в потоке)"
+            )
+            if samples:
+                lines.append("   верх стека:")
+                for where, n in session.leaf[name].most_common(top):
+                    lines.append(f"   {n:6} {n / samples:6.1%}  {where}")
+                lines.append("   код бота:")
+                for where, n in session.own[name].most_common(top):
+                    lines.append(f"   {n:6} {n / samples:6.1%}  {where}")
+            lines.append("")
+        if not order:
+            lines.append("Хендлеры не вызывались.")
+        return "\n".join(lines)
+
+
+profiler = Profiler(cfg.PROFILER_INTERVAL_MS / 1000, cfg.PROFILER_MAX_SECONDS)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates
+
+from config import cfg
+from services.metrics_service import api_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые публикуют что-то в чат и подпадают под лимит на чат
+CHAT_LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity накоплено.
+    Ожидающие запросы обслуживаются по очереди (asyncio.Lock — FIFO).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        return not self._lock.locked()
+
+
+class RateLimiter(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: ставит исходящие запросы в очередь под общий лимит
+    (около 30 сообщений в секунду) и лимиты на отдельный чат, а на
+    429 Too Many Requests ждёт retry_after и повторяет запрос.
+    """
+
+    def __init__(self, global_per_sec: float, group_per_min: float, private_per_sec: float,
+                 max_retries: int, max_chat_buckets: int = 10000):
+        self.global_bucket = TokenBucket(global_per_sec, global_per_sec)
+        self.group_per_min = group_per_min
+        self.private_per_sec = private_per_sec
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self._chat_buckets: "OrderedDict[object, TokenBucket]" = OrderedDict()
+        self.queue_depth = 0
+        self.retries = 0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_per_sec, 1)
+            else:
+                bucket = TokenBucket(self.group_per_min / 60, self.group_per_min)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_chat_buckets:
+                # вытесняем самое старое ведро, если его сейчас никто не ждёт
+                old_id, old_bucket = next(iter(self._chat_buckets.items()))
+                if old_bucket.idle:
+                    del self._chat_buckets[old_id]
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        chat_bucket = None
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None and type(method).__name__.startswith(CHAT_LIMITED_PREFIXES):
+            chat_bucket = self._chat_bucket(chat_id)
+
+        attempt = 0
+        while True:
+            self.queue_depth += 1
+            try:
+                if chat_bucket is not None:
+                    await chat_bucket.acquire()
+                await self.global_bucket.acquire()
+            finally:
+                self.queue_depth -= 1
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning("Flood limit on %s (chat %s), retry after %ss",
+                               type(method).__name__, chat_id, e.retry_after)
+                (chat_bucket or self.global_bucket).pause(e.retry_after)
+
+
+rate_limiter = RateLimiter(
+    global_per_sec=cfg.RATE_LIMIT_GLOBAL_PER_SEC,
+    group_per_min=cfg.RATE_LIMIT_GROUP_PER_MIN,
+    private_per_sec=cfg.RATE_LIMIT_PRIVATE_PER_SEC,
+    max_retries=cfg.RATE_LIMIT_MAX_RETRIES,
+)
+api_queue_depth.func = lambda: rate_limiter.queue_depth
@@ -0,0 +1,93 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from config import cfg
+from db import AsyncSessionLocal
+from models import RoleAssignment
+
+
+class RoleCache:
+    """
+    Кэш ролей по чатам: chat_id -> {user_id: role_id}.
+    Карта чата загружается из БД целиком при первом обращении, дальше
+    обновляется на месте при повышении/снятии ролей. Число чатов в памяти
+    ограничено, самые давно использованные вытесняются (LRU).
+    """
+
+    def __init__(self, max_chats: int):
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, Dict[int, int]]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # сколько корутин ждут или выполняют загрузку чата; лок живёт, пока их больше нуля
+        self._waiters: Dict[int, int] = {}
+        # номер версии чата: карту, загруженную до изменения, не кэшируем
+        self._versions: Dict[int, int] = {}
+
+    async def _load(self, chat_id: int) -> Dict[int, int]:
+        roles = self._chats.get(chat_id)
+        if roles is not None:
+            self._chats.move_to_end(chat_id)
+            return roles
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._waiters[chat_id] = self._waiters.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                roles = self._chats.get(chat_id)
+                if roles is None:
+                    version = self._versions.get(chat_id, 0)
+                    async with AsyncSessionLocal() as session:
+                        q = await session.execute(
+                            select(RoleAssignment.user_id, RoleAssignment.role_id)
+                            .where(RoleAssignment.chat_id == chat_id)
+                            .order_by(RoleAssignment.id))
+                        roles = {}
+                        for user_id, role_id in q.all():
+                            # при дублях побеждает первая запись, как и у .scalars().first()
+                            roles.setdefault(user_id, role_id)
+                    if self._versions.get(chat_id, 0) == version:
+                        self._chats[chat_id] = roles
+                        while len(self._chats) > self.max_chats:
+                            self._chats.popitem(last=False)
+        finally:
+            self._waiters[chat_id] -= 1
+            if not self._waiters[chat_id]:
+                del self._waiters[chat_id]
+                self._locks.pop(chat_id, None)
+                self._versions.pop(chat_id, None)
+        return roles
+
+    def _changed(self, chat_id: int):
+        if chat_id in self._waiters:
+            self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+
+    async def get_role(self, chat_id: int, user_id: int) -> Optional[int]:
+        roles = await self._load(chat_id)
+        return roles.get(user_id)
+
+    async def get_chat_roles(self, chat_id: int) -> Dict[int, int]:
+        return dict(await self._load(chat_id))
+
+    def set_role(self, chat_id: int, user_id: int, role_id: int):
+        roles = self._chats.get(chat_id)
+        if roles is not None:
+            roles[user_id] = role_id
+        else:
+            self._changed(chat_id)
+
+    def remove_role(self, chat_id: int, user_id: int):
+        roles = self._chats.get(chat_id)
+        if roles is not None:
+            roles.pop(user_id, None)
+        else:
+            self._changed(chat_id)
+
+    def invalidate(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+        self._changed(chat_id)
+
+
+role_cache = RoleCache(cfg.ROLE_CACHE_MAX_CHATS)
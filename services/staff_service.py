@@ -0,0 +1,56 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple
+
+from config import cfg
+
+
+class StaffListCache:
+    """
+    Готовый текст списка администрации по чатам. Сбрасывается при выдаче и
+    снятии ролей, смене ника и синхронизации админов; кроме того, живёт не
+    дольше ttl секунд, чтобы подтягивать смену имён в Telegram. Одновременные
+    промахи по одному чату ждут одну сборку.
+    """
+
+    def __init__(self, max_chats: int, ttl: float):
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self._texts: "OrderedDict[int, Tuple[float, str]]" = OrderedDict()
+        self._building: Dict[int, asyncio.Task] = {}
+        # номер версии чата: сборку, начатую до сброса, не кэшируем
+        self._versions: Dict[int, int] = {}
+
+    async def get(self, chat_id: int, build: Callable[[], Awaitable[str]]) -> str:
+        item = self._texts.get(chat_id)
+        if item is not None and item[0] > time.monotonic():
+            self._texts.move_to_end(chat_id)
+            return item[1]
+        task = self._building.get(chat_id)
+        if task is None:
+            task = asyncio.create_task(self._build(chat_id, build))
+            task.add_done_callback(lambda t: self._building.get(chat_id) is t and self._building.pop(chat_id))
+            self._building[chat_id] = task
+        return await asyncio.shield(task)
+
+    async def _build(self, chat_id: int, build: Callable[[], Awaitable[str]]) -> str:
+        version = self._versions.get(chat_id, 0)
+        text = await build()
+        if self._versions.get(chat_id, 0) == version:
+            self._texts[chat_id] = (time.monotonic() + self.ttl, text)
+            self._texts.move_to_end(chat_id)
+            while len(self._texts) > self.max_chats:
+                evicted, _ = self._texts.popitem(last=False)
+                self._versions.pop(evicted, None)
+        return text
+
+    def invalidate(self, chat_id: int):
+        self._texts.pop(chat_id, None)
+        if chat_id in self._building:
+            self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+            # следующий запрос не должен ждать устаревшую сборку
+            self._building.pop(chat_id, None)
+
+
+staff_lists = StaffListCache(cfg.STAFF_CACHE_MAX_CHATS, cfg.STAFF_CACHE_TTL)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import select, delete
+
+from config import cfg
+from db import AsyncSessionLocal, upsert_insert
+from models import Username
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(username: str) -> str:
+    return username.strip().lstrip("@").lower()
+
+
+class UsernameIndex:
+    """
+    Индекс @username -> user_id. Bot API не умеет искать пользователя по
+    username, поэтому имена запоминаются из сообщений, которые видит бот.
+    В памяти — LRU на max_size имён, новые и изменившиеся пары пачками
+    пишутся в usernames раз в flush_interval секунд; промах читается из БД.
+    """
+
+    def __init__(self, max_size: int, flush_interval: float, batch_size: int = 500):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._by_name: "OrderedDict[str, int]" = OrderedDict()
+        self._by_user: Dict[int, str] = {}
+        self._pending: Dict[str, int] = {}
+        self._task = None
+
+    def _put(self, name: str, user_id: int):
+        old = self._by_user.get(user_id)
+        if old is not None and old != name and self._by_name.get(old) == user_id:
+            # пользователь сменил username — старое имя больше не его
+            del self._by_name[old]
+        prev_owner = self._by_name.get(name)
+        if prev_owner is not None and prev_owner != user_id:
+            self._by_user.pop(prev_owner, None)
+        self._by_name[name] = user_id
+        self._by_name.move_to_end(name)
+        self._by_user[user_id] = name
+        while len(self._by_name) > self.max_size:
+            evicted, evicted_user = self._by_name.popitem(last=False)
+            if self._by_user.get(evicted_user) == evicted:
+                del self._by_user[evicted_user]
+
+    def record(self, user_id: int, username: Optional[str]):
+        if not username:
+            return
+        name = username.lower()
+        if self._by_name.get(name) == user_id:
+            self._by_name.move_to_end(name)
+            return
+        old = self._by_user.get(user_id)
+        if old is not None and self._pending.get(old) == user_id:
+            # старое имя ещё не записано — писать его уже не нужно
+            del self._pending[old]
+        self._put(name, user_id)
+        self._pending[name] = user_id
+
+    async def resolve(self, username: str) -> Optional[int]:
+        name = normalize(username)
+        if not name:
+            return None
+        user_id = self._by_name.get(name)
+        if user_id is not None:
+            self._by_name.move_to_end(name)
+            return user_id
+        async with AsyncSessionLocal() as session:
+            q = await session.execute(select(Username.user_id).where(Username.username == name))
+            user_id = q.scalar()
+        if name in self._by_name:
+            return self._by_name[name]
+        if user_id is None:
+            return None
+        current = self._by_user.get(user_id)
+        if current is not None and current != name:
+            # пользователь с тех пор сменил username — строка в БД устарела
+            return None
+        self._put(name, user_id)
+        return user_id
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = datetime.utcnow()
+        rows = [{"username": name, "user_id": user_id, "updated_at": now} for name, user_id in pending.items()]
+        try:
+            async with AsyncSessionLocal() as session:
+                for i in range(0, len(rows), self.batch_size):
+                    batch = rows[i:i + self.batch_size]
+                    # прежние имена тех же пользователей больше им не принадлежат
+                    await session.execute(
+                        delete(Username).where(
+                            Username.user_id.in_([r["user_id"] for r in batch]),
+                            Username.username.notin_([r["username"] for r in batch])))
+                    stmt = upsert_insert(Username).values(batch)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[Username.username],
+                        set_={"user_id": stmt.excluded.user_id, "updated_at": stmt.excluded.updated_at},
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except Exception:
+            for name, user_id in pending.items():
+                if self._by_user.get(user_id, name) == name:
+                    self._pending.setdefault(name, user_id)
+            raise
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Could not flush usernames: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.exception("Could not flush usernames: %s", e)
+
+
+usernames = UsernameIndex(cfg.USERNAMES_CACHE_SIZE, cfg.USERNAMES_FLUSH_INTERVAL)
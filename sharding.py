@@ -0,0 +1,426 @@
+"""
+Запуск в несколько процессов (SHARD_WORKERS > 1).
+
+Фронт-процесс получает обновления (polling или webhook, как и одиночный бот)
+и по chat_id раздаёт их воркерам: воркер = chat_id % SHARD_WORKERS. Воркеры —
+дочерние процессы `python sharding.py worker <номер> <всего> <порт>` с полным набором
+роутеров; связь — TCP на 127.0.0.1, по одному JSON-сообщению на строку.
+
+Порядок обновлений внутри чата сохраняется: фронт пишет их в один поток
+в порядке получения, а воркер запускает обработку обновления чата только после
+завершения предыдущего. Разные чаты обрабатываются параллельно.
+
+Фронт собирает с воркеров метрики и состояние и отдаёт их на
+METRICS_HOST:METRICS_PORT: /metrics (метка worker) и /health (JSON).
+Умерший воркер перезапускается; обновления для него ждут в очереди фронта.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from config import cfg
+
+logger = logging.getLogger(__name__)
+
+# Типы обновлений, где чат лежит прямо в объекте
+CHAT_UPDATES = ("message", "edited_message", "channel_post", "edited_channel_post", "my_chat_member",
+                "chat_member", "chat_join_request", "message_reaction", "message_reaction_count",
+                "chat_boost", "removed_chat_boost", "business_message", "edited_business_message")
+
+
+def shard_key(data: dict) -> int:
+    """
+    chat_id обновления; для обновлений без чата — id пользователя.
+    """
+    for name, value in data.items():
+        if name == "update_id" or not isinstance(value, dict):
+            continue
+        if name in CHAT_UPDATES and isinstance(value.get("chat"), dict):
+            return value["chat"]["id"]
+        if name == "callback_query" and isinstance(value.get("message"), dict):
+            return value["message"]["chat"]["id"]
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict):
+            return user["id"]
+    return 0
+
+
+def shard_for(chat_id: int, workers: int) -> int:
+    return chat_id % workers
+
+
+# --- фронт ---
+
+class WorkerHandle:
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.connected = asyncio.Event()
+        self.sent = 0
+        self.restarts = 0
+        self.stats: dict = {}
+        self.stats_at: Optional[float] = None
+
+
+class ShardFront:
+    """
+    Подменяет Dispatcher там, где нужен только feed_update
+    (polling-цикл фронта и webhook.WebhookServer): обновление не обрабатывается,
+    а уходит своему воркеру.
+    """
+
+    def __init__(self, dp, workers: int):
+        self.dp = dp
+        self.workers = [WorkerHandle(i) for i in range(workers)]
+        self.received = 0
+        self.port: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def resolve_used_update_types(self):
+        return self.dp.resolve_used_update_types()
+
+    async def feed_update(self, bot, update):
+        self.feed_raw(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+
+    def feed_raw(self, data: dict):
+        self.received += 1
+        worker = self.workers[shard_for(shard_key(data), len(self.workers))]
+        worker.queue.put_nowait(data)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._on_connect, "127.0.0.1", cfg.SHARD_PORT)
+        self.port = self._server.sockets[0].getsockname()[1]
+        for worker in self.workers:
+            self._tasks.append(asyncio.create_task(self._supervise(worker)))
+            self._tasks.append(asyncio.create_task(self._pump(worker)))
+        self._tasks.append(asyncio.create_task(self._poll_stats()))
+        logger.info("Shard front on port %s, %s workers", self.port, len(self.workers))
+
+    async def _supervise(self, worker: WorkerHandle):
+        script = os.path.abspath(__file__)
+        while not self._stopping:
+            worker.process = await asyncio.create_subprocess_exec(
+                sys.executable, script, "worker", str(worker.index), str(len(self.workers)), str(self.port),
+                cwd=os.path.dirname(script))
+            code = await worker.process.wait()
+            worker.connected.clear()
+            worker.writer = None
+            if self._stopping:
+                return
+            worker.restarts += 1
+            logger.error("Shard worker %s exited with code %s, restarting", worker.index, code)
+            await asyncio.sleep(1)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        hello = json.loads(await reader.readline())
+        worker = self.workers[hello["worker"]]
+        worker.writer = writer
+        worker.connected.set()
+        logger.info("Shard worker %s connected (pid %s)", worker.index, hello.get("pid"))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("op") == "stats":
+                    worker.stats = message
+                    worker.stats_at = time.time()
+        except asyncio.CancelledError:
+            # фронт останавливается
+            pass
+        finally:
+            if worker.writer is writer:
+                worker.writer = None
+                worker.connected.clear()
+            writer.close()
+
+    async def _pump(self, worker: WorkerHandle):
+        while True:
+            data = await worker.queue.get()
+            while True:
+                await worker.connected.wait()
+                writer = worker.writer
+                try:
+                    writer.write(json.dumps({"op": "update", "update": data}, ensure_ascii=False).encode() + b"\n")
+                    await writer.drain()
+                    worker.sent += 1
+                    break
+                except (ConnectionError, AttributeError):
+                    # воркер отвалился — ждём перезапуска и отправляем то же обновление
+                    worker.connected.clear()
+
+    async def _poll_stats(self):
+        while True:
+            for worker in self.workers:
+                if worker.writer is not None:
+                    try:
+                        worker.writer.write(b'{"op": "stats"}\n')
+                    except ConnectionError:
+                        pass
+            await asyncio.sleep(cfg.SHARD_STATS_INTERVAL)
+
+    def health(self) -> dict:
+        now = time.time()
+        workers = []
+        for w in self.workers:
+            workers.append({
+                "index": w.index,
+                "pid": w.process.pid if w.process else None,
+                "alive": w.process is not None and w.process.returncode is None,
+                "connected": w.connected.is_set(),
+                "queued": w.queue.qsize(),
+                "sent": w.sent,
+                "restarts": w.restarts,
+                "processed": w.stats.get("processed"),
+                "inflight": w.stats.get("inflight"),
+                "stats_age": round(now - w.stats_at, 1) if w.stats_at else None,
+            })
+        return {"ok": all(w["alive"] and w["connected"] for w in workers),
+                "received": self.received, "workers": workers}
+
+    def metrics_text(self) -> str:
+        from services.metrics_service import registry
+
+        texts = [("front", registry.render())]
+        texts += [(str(w.index), w.stats["metrics"]) for w in self.workers if w.stats.get("metrics")]
+        return merge_metrics(texts)
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    await asyncio.wait_for(worker.process.wait(), 10)
+                except asyncio.TimeoutError:
+                    worker.process.kill()
+        if self._server is not None:
+            self._server.close()
+
+
+def merge_metrics(texts) -> str:
+    """
+    Склеивает тексты Prometheus нескольких процессов, добавляя метку worker.
+    Сэмплы одной метрики идут подряд, как требует формат.
+    """
+    blocks: Dict[str, List[str]] = {}
+    for worker, text in texts:
+        name = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split()[2]
+                block = blocks.setdefault(name, [])
+                if line not in block:
+                    block.append(line)
+                continue
+            if not line or name is None:
+                continue
+            metric, _, rest = line.partition(" ")
+            if "{" in metric:
+                metric = metric.replace("{", f'{{worker="{worker}",', 1)
+            else:
+                metric = f'{metric}{{worker="{worker}"}}'
+            blocks[name].append(f"{metric} {rest}")
+    return "\n".join(line for block in blocks.values() for line in block) + "\n"
+
+
+async def start_front_server(front: ShardFront):
+    if not cfg.METRICS_PORT:
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(text=front.metrics_text(), content_type="text/plain", charset="utf-8")
+
+    async def handle_health(request):
+        health = front.health()
+        return web.json_response(health, status=200 if health["ok"] else 503)
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, cfg.METRICS_HOST, cfg.METRICS_PORT).start()
+    logger.info("Shard metrics on http://%s:%s/metrics and /health", cfg.METRICS_HOST, cfg.METRICS_PORT)
+    return runner
+
+
+async def poll_updates(bot, front: ShardFront):
+    """
+    Long polling фронта: обновления не разбираются хендлерами, а уходят воркерам.
+    """
+    allowed = front.resolve_used_update_types()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed)
+        except Exception as e:
+            logger.exception("getUpdates failed: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await front.feed_update(bot, update)
+            offset = update.update_id + 1
+
+
+async def run_front(bot, dp, setup_bot):
+    from db import init_db
+    from webhook import run_webhook
+
+    # схема и миграции — один раз во фронте, до запуска воркеров
+    await init_db()
+    await setup_bot()
+    front = ShardFront(dp, cfg.SHARD_WORKERS)
+    await front.start()
+    metrics_runner = await start_front_server(front)
+    try:
+        if cfg.RUN_MODE == "webhook":
+            await run_webhook(bot, front)
+        else:
+            await bot.delete_webhook()
+            await poll_updates(bot, front)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await front.stop()
+        await bot.session.close()
+
+
+# --- воркер ---
+
+class OrderedFeeder:
+    """
+    Обработка обновлений воркером: чаты параллельно, внутри чата — по очереди.
+    """
+
+    def __init__(self, bot, dp, max_pending: int):
+        self.bot = bot
+        self.dp = dp
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tails: Dict[int, asyncio.Task] = {}
+        self.processed = 0
+        self.inflight = 0
+
+    async def submit(self, data: dict):
+        from aiogram.types import Update
+
+        await self._slots.acquire()
+        key = shard_key(data)
+        update = Update.model_validate(data, context={"bot": self.bot})
+        prev = self._tails.get(key)
+        task = asyncio.create_task(self._run(update, prev))
+        self._tails[key] = task
+        self.inflight += 1
+
+        def _done(t, key=key):
+            self._slots.release()
+            self.inflight -= 1
+            if self._tails.get(key) is t:
+                del self._tails[key]
+
+        task.add_done_callback(_done)
+
+    async def _run(self, update, prev: Optional[asyncio.Task]):
+        if prev is not None:
+            await asyncio.wait([prev])
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            logger.exception("Error while processing update %s: %s", update.update_id, e)
+        finally:
+            self.processed += 1
+
+    async def drain(self, timeout: float = 10.0):
+        if self._tails:
+            await asyncio.wait(set(self._tails.values()), timeout=timeout)
+
+
+async def run_worker(index: int, workers: int, port: int):
+    from bot import bot, dp
+    from services.activity_service import activity
+    from services.admin_sync_service import admin_sync
+    from services.broadcast_service import broadcasts
+    from services.chats_service import known_chats
+    from services.expiry_service import expiry
+    from services.latency_service import latency
+    from services.members_service import members
+    from services.metrics_service import registry
+    from services.rate_limiter import rate_limiter
+    from services.usernames_service import usernames
+
+    # общий лимит Bot API делится между воркерами, лимиты чатов — нет: чат живёт в одном воркере
+    rate_limiter.global_bucket.rate /= workers
+    rate_limiter.global_bucket.capacity = rate_limiter.global_bucket.tokens = max(1.0, rate_limiter.global_bucket.rate)
+    expiry.owns = lambda chat_id: shard_for(chat_id, workers) == index
+    expiry.start()
+    activity.start()
+    known_chats.start()
+    members.start()
+    usernames.start()
+    latency.start(bot)
+    admin_sync.owns = expiry.owns
+    admin_sync.start(bot)
+    if index == 0:
+        await broadcasts.resume(bot)
+
+    feeder = OrderedFeeder(bot, dp, cfg.SHARD_MAX_PENDING)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(json.dumps({"op": "hello", "worker": index, "pid": os.getpid()}).encode() + b"\n")
+    await writer.drain()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message["op"] == "update":
+                await feeder.submit(message["update"])
+            elif message["op"] == "stats":
+                writer.write(json.dumps({
+                    "op": "stats", "processed": feeder.processed, "inflight": feeder.inflight,
+                    "metrics": registry.render(),
+                }).encode() + b"\n")
+                await writer.drain()
+    finally:
+        await feeder.drain()
+        await broadcasts.stop()
+        await admin_sync.stop()
+        await expiry.stop()
+        await activity.stop()
+        await known_chats.stop()
+        await members.stop()
+        await usernames.stop()
+        await latency.stop()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    import signal
+
+    if len(sys.argv) == 5 and sys.argv[1] == "worker":
+        async def _worker():
+            task = asyncio.current_task()
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+            try:
+                await run_worker(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(_worker())
+    else:
+        print("Usage: python sharding.py worker <index> <workers> <port>  (запускается фронтом из bot.py)")
@@ -0,0 +1,133 @@
+"""
+Приём обновлений через webhook (RUN_MODE=webhook) вместо long polling.
+
+Telegram получает ответ сразу после разбора обновления, а обработка идёт
+в фоне через Dispatcher.feed_update. Одновременно обрабатывается не больше
+WEBHOOK_MAX_INFLIGHT обновлений; сверх лимита сервер отвечает 503 и Telegram
+повторит доставку позже.
+
+Заголовок X-Telegram-Bot-Api-Secret-Token проверяется всегда. Если
+WEBHOOK_SECRET не задан, а WEBHOOK_BASE_URL задан, секрет генерируется при
+старте и передаётся в setWebhook; без WEBHOOK_BASE_URL сервер без секрета
+не запускается.
+
+Локальная проверка: запустите бота с RUN_MODE=webhook, пустым
+WEBHOOK_BASE_URL (тогда setWebhook не вызывается) и любым WEBHOOK_SECRET и
+отправьте записанные обновления, по одному JSON-объекту на строку:
+
+    python webhook.py post updates.jsonl http://127.0.0.1:8080/webhook
+"""
+import asyncio
+import hmac
+import logging
+import secrets
+from typing import Set
+
+from aiohttp import web
+from aiogram.types import Update
+
+from config import cfg
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+
+    def __init__(self, bot, dp, path: str, secret: str, max_inflight: int):
+        self.bot = bot
+        self.dp = dp
+        self.path = path
+        self.secret = secret
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return web.Response(status=401)
+        if self.inflight >= self.max_inflight:
+            return web.Response(status=503)
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={"bot": self.bot})
+        except Exception:
+            return web.Response(status=400)
+
+        self.inflight += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            logger.exception("Error while processing update %s: %s", update.update_id, e)
+        finally:
+            self.inflight -= 1
+
+    async def drain(self, timeout: float = 10.0):
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+
+async def run_webhook(bot, dp):
+    secret = cfg.WEBHOOK_SECRET
+    if not secret:
+        if not cfg.WEBHOOK_BASE_URL:
+            raise RuntimeError("WEBHOOK_SECRET is not set. Please set WEBHOOK_SECRET env var.")
+        # Telegram узнает секрет из setWebhook, больше он никому не нужен
+        secret = secrets.token_urlsafe(32)
+    server = WebhookServer(bot, dp, cfg.WEBHOOK_PATH, secret, cfg.WEBHOOK_MAX_INFLIGHT)
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, cfg.WEBHOOK_HOST, cfg.WEBHOOK_PORT)
+    await site.start()
+    logger.info("Webhook server listening on %s:%s%s", cfg.WEBHOOK_HOST, cfg.WEBHOOK_PORT, cfg.WEBHOOK_PATH)
+
+    if cfg.WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            url=cfg.WEBHOOK_BASE_URL.rstrip("/") + cfg.WEBHOOK_PATH,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(100, cfg.WEBHOOK_MAX_INFLIGHT),
+        )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.drain()
+        await runner.cleanup()
+
+
+async def post_updates(path: str, url: str):
+    import json
+    import aiohttp
+
+    headers = {SECRET_HEADER: cfg.WEBHOOK_SECRET} if cfg.WEBHOOK_SECRET else {}
+    async with aiohttp.ClientSession() as session:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                async with session.post(url, json=json.loads(line), headers=headers) as resp:
+                    print(resp.status)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "post":
+        target = sys.argv[3] if len(sys.argv) > 3 else f"http://127.0.0.1:{cfg.WEBHOOK_PORT}{cfg.WEBHOOK_PATH}"
+        asyncio.run(post_updates(sys.argv[2], target))
+    else:
+        print("Usage: python webhook.py post updates.jsonl [url]")